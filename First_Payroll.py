@@ -3,7 +3,9 @@ import numpy as np
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
 from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font
+
+from Payroll_Allocation import allocate_daily_overtime
+from Payroll_Render import add_highlights, PAYROLL_STYLES, ERRORS_STYLES
 
 # Create a Tkinter root window
 root = Tk()
@@ -71,26 +73,9 @@ try:
 
     # Calculate the overtime for each ticket, considering that the same employee
     # can have more than one ticket in a day.
-
-    grouped_by_name = merged_df.groupby(
-        ['Employee Name'])
-
-    for name, group_name in grouped_by_name:
-        grouped_by_name_by_date = group_name.groupby(
-            [merged_df['Ticket Date'].dt.date])
-        for date, indices in grouped_by_name_by_date.groups.items():
-            worked_hours_needed = 8
-            for index in indices:
-                if worked_hours_needed == 0:
-                    merged_df.loc[index,
-                                  'Overtime'] = merged_df.loc[index, 'Lunch Adjusted']
-                elif worked_hours_needed >= merged_df.loc[index, 'Lunch Adjusted']:
-                    worked_hours_needed -= merged_df.loc[index,
-                                                         'Lunch Adjusted']
-                else:
-                    merged_df.loc[index, 'Overtime'] = merged_df.loc[index,
-                                                                     'Lunch Adjusted'] - worked_hours_needed
-                    worked_hours_needed = 0
+    # The 8 hour budget of every employee and day is spent in one grouped pass,
+    # following the order of the tickets within the day.
+    merged_df['Overtime'] = allocate_daily_overtime(merged_df)
 
     # END BUG FIXED
     ################################################
@@ -311,39 +296,21 @@ try:
     sheet1 = wb['Payroll']
     sheet2 = wb['Errors']
 
-    # Create a red bold font
-    red_font = Font(color="FF0000", bold=True)
-
-    # Check each cell in column E (5th column) for both sheets
+    # Fill in the missing Clock Out punches of both sheets
     for sheet in [sheet1, sheet2]:
-        # Modify max_col to 7 for 'Payroll' sheet
-        for row in sheet.iter_rows(min_row=2, min_col=4, max_col=7):
-            for cell in row:
-                if cell.column_letter == 'C' and (cell.value is None or cell.value == ''):
-                    cell.value = 'Clock In Time?'
-                    cell.font = red_font
-                elif cell.column_letter == 'D' and (cell.value is None or cell.value == ''):
-                    cell.value = 'Clock Out Time?'
-                    cell.font = red_font
-
-    # Apply font color formatting to Overtime column
+        for cell in sheet['D'][1:]:
+            if cell.value is None or cell.value == '':
+                cell.value = 'Clock Out Time?'
+
+    # Negative overtime is paid as none
     for cell in sheet1['H'][1:]:
-        overtime_value = cell.value
-        approved_start_date = cell.offset(column=13).value
-        approved_end_date = cell.offset(column=14).value
-
-        if overtime_value is not None:
-            if isinstance(overtime_value, (int, float)):
-                if float(overtime_value) > 0 and (approved_start_date is None or approved_end_date is None):
-                    cell.font = red_font
-                else:
-                    cell.font = None
-                if float(overtime_value) < 0:
-                    cell.value = 0
-            else:
-                cell.font = red_font
-        else:
-            cell.font = None
+        if isinstance(cell.value, (int, float)) and cell.value < 0:
+            cell.value = 0
+
+    # Missing punches, overtime without an approval window and column G of the
+    # Errors sheet under 8 in red, as conditional formatting over the columns
+    add_highlights(sheet1, PAYROLL_STYLES['highlights'], sheet1.max_row - 1)
+    add_highlights(sheet2, ERRORS_STYLES['highlights'], sheet2.max_row - 1)
 
     # Set column widths
     sheet1.column_dimensions['A'].width = 11.26
@@ -370,22 +337,6 @@ try:
     sheet1.column_dimensions['V'].width = 29
     sheet1.column_dimensions['W'].width = 29
 
-    # Select the sheets
-    sheet2 = wb['Errors']
-
-    # Apply font color formatting to Overtime column (Column G) on the Errors sheet
-    for cell in sheet2['G'][1:]:
-        overtime_value = cell.value
-
-        if overtime_value is not None:
-            if isinstance(overtime_value, (int, float)):
-                if float(overtime_value) < 8:
-                    cell.font = red_font
-            else:
-                cell.font = red_font
-        else:
-            cell.font = None
-
     # Set column widths
     sheet2.column_dimensions['A'].width = 11.26
     sheet2.column_dimensions['B'].width = 26.14
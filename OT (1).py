@@ -1,88 +1,59 @@
 import pandas as pd
-import datetime
 import numpy as np
 from openpyxl import load_workbook
 
-def round_time(dt):
-    # Calculate the number of minutes past the last 15-minute mark
-    minutes = (dt.minute % 15) * 60 + dt.second
-
-    # If the number of minutes is less than 7, round down; otherwise, round up
-    if minutes < 7 * 60:
-        dt = dt - datetime.timedelta(minutes=dt.minute % 15, seconds=dt.second)
-    else:
-        dt = dt + datetime.timedelta(minutes=15 - dt.minute % 15, seconds=-dt.second)
-
-    return dt
+from Payroll_Reports import aggregate_by_day
+from Payroll_Roster import load_roster, missing_employees
+from Payroll_Rounding import round_punches
 
 # Load the Excel file
 df = pd.read_excel('C:\\test\\Payroll.xlsx')
 
-# Load the Employee Name data from Test3.xlsx file
-df_test3 = pd.read_excel('C:\\test\\Test3.xlsx')
-employee_names_test3 = df_test3['Employee Name'].unique()
+# Load the roster of Test3.xlsx (once per version of the file)
+roster = load_roster('C:\\test\\Test3.xlsx')
 
 # Convert the 'Ticket Date', 'Clock In', and 'Clock Out' columns to datetime
 df['Ticket Date'] = pd.to_datetime(df['Ticket Date'])
-df['Clock In'] = pd.to_datetime(df['Clock In']).apply(round_time)
-df['Clock Out'] = pd.to_datetime(df['Clock Out']).apply(round_time)
+df['Clock In'] = round_punches(df['Clock In'])
+df['Clock Out'] = round_punches(df['Clock Out'])
 
 # Calculate the total hours worked for each job
 df['Total Hours Worked'] = (df['Clock Out'] - df['Clock In']).dt.total_seconds() / 3600
 
-# Create a list to hold the results
-results = []
-
-# Create a DataFrame to hold missing Employees
-missing_employees = pd.DataFrame(columns=['Employee Name', 'Ticket Date'])
-
-# Group by 'Employee Name', 'JobNo|Customer|Description', 'Agency', and 'Ticket Date'
-grouped = df.groupby(['Employee Name', 'JobNo|Customer|Description', 'Agency', df['Ticket Date'].dt.date])
-
-# Group by 'Employee Name', 'JobNo|Customer|Description', 'Agency', and 'Ticket Date'
-grouped = df.groupby(['Employee Name', 'JobNo|Customer|Description', 'Agency', df['Ticket Date'].dt.date])
-
-for name, group in grouped:
-    if name[0] not in employee_names_test3:
-        missing_employees = missing_employees.append({'Employee Name': name[0], 'Ticket Date': name[3]}, ignore_index=True)
-
-for name, group in grouped:
-    total_hours = group['Total Hours Worked'].sum()
-
-    # Deduct 30 minutes for lunch break if the employee worked for more than 5 hours
-    if total_hours > 5:
-        total_hours -= 0.5
-
-    regular_hours = round(min(8, total_hours), 2)
-    overtime_hours = round(max(0, total_hours - 8), 2)
-
-    #SB
-    print(group.columns)
-
-    # If the Ticket Date is on a Saturday or Sunday, all hours are overtime
-    if group['Ticket Date'].dt.dayofweek.iloc[0] >= 5:
-        overtime_hours = round(total_hours, 2)
-        regular_hours = 0
-
-    results.append(pd.DataFrame({
-        'Employee Name': [name[0]],
-        'Employee ID': [group['Employee ID'].iloc[0]],
-        'JobNo|Customer|Description': [name[1]],
-        'Agency': [name[2]],
-        'Ticket Date': [name[3]],
-        'Day': [group['Ticket Date'].dt.day_name().iloc[0]],
-        'Regular Hours': [regular_hours],
-        'Overtime Hours': [overtime_hours],
-        'Clock In': [group['Clock In'].iloc[0]],
-        'Clock Out': [group['Clock Out'].iloc[0]],
-        'Supervisors Name': [group['Supervisors Name'].iloc[0]],
-        'PM Assigned': [group['PM Assigned'].iloc[0]],
-        'Email': [group['Email'].iloc[0]],
-        'WTL Approved': [group['WTL Approved'].iloc[0]]
-    }))
-
-# Concatenate all the results into a single dataframe
-result = pd.concat(results)
+# Employees missing from the roster, one row per employee and day
+missing_df = missing_employees(df, roster)
+
+totals, first = aggregate_by_day(df, ['Employee Name', 'JobNo|Customer|Description', 'Agency'],
+                                 {'Total Hours Worked': ('Total Hours Worked', 'sum')})
+total_hours = totals['Total Hours Worked'].to_numpy()
+
+# Deduct 30 minutes for lunch break if the employee worked for more than 5 hours
+total_hours = np.where(total_hours > 5, total_hours - 0.5, total_hours)
+
+regular_hours = np.round(np.minimum(8, total_hours), 2)
+overtime_hours = np.round(np.maximum(0, total_hours - 8), 2)
+
+# If the Ticket Date is on a Saturday or Sunday, all hours are overtime
+weekend = first['Ticket Date'].dt.dayofweek.to_numpy() >= 5
+overtime_hours = np.where(weekend, np.round(total_hours, 2), overtime_hours)
+regular_hours = np.where(weekend, 0, regular_hours)
+
+result = pd.DataFrame({
+    'Employee Name': first['Employee Name'].to_numpy(),
+    'Employee ID': first['Employee ID'].to_numpy(),
+    'JobNo|Customer|Description': first['JobNo|Customer|Description'].to_numpy(),
+    'Agency': first['Agency'].to_numpy(),
+    'Ticket Date': first['Ticket Date'].dt.date.to_numpy(),
+    'Day': first['Ticket Date'].dt.day_name().to_numpy(),
+    'Regular Hours': regular_hours,
+    'Overtime Hours': overtime_hours,
+    'Clock In': first['Clock In'].to_numpy(),
+    'Clock Out': first['Clock Out'].to_numpy(),
+    'Supervisors Name': first['Supervisors Name'].to_numpy(),
+    'PM Assigned': first['PM Assigned'].to_numpy(),
+    'Email': first['Email'].to_numpy(),
+    'WTL Approved': first['WTL Approved'].to_numpy()
+})
 
 # Save the result to a new Excel file
 result.to_excel('C:\\test\\result.xlsx', index=False)
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+WEEK_DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# First day of the payroll week; Monday gives ISO weeks
+WEEK_START = 'Monday'
+
+
+# Position of the week start day, Monday being 0 like Series.dt.dayofweek
+def week_start_day(week_start=WEEK_START):
+    if week_start not in WEEK_DAYS:
+        raise ValueError('The week start must be one of: ' + ', '.join(WEEK_DAYS))
+    return WEEK_DAYS.index(week_start)
+
+
+# The days of the week in payroll order, starting with 'week_start'
+def week_days(week_start=WEEK_START):
+    start = week_start_day(week_start)
+    return WEEK_DAYS[start:] + WEEK_DAYS[:start]
+
+
+# The first day of the payroll week of every date (NaT stays NaT)
+def week_of(dates, week_start=WEEK_START):
+    dates = pd.to_datetime(dates).dt.normalize()
+    offset = (dates.dt.dayofweek - week_start_day(week_start)) % 7
+    return dates - pd.to_timedelta(offset, unit='D')
+
+
+# Budget of every row: a number, or the name of the column holding it
+def row_budget(df, budget):
+    return df[budget].to_numpy(dtype=float) if isinstance(budget, str) else budget
+
+
+# Spend an hour budget over every group at once.
+# 'hours' must already be in the order the budget is consumed in; rows whose
+# group key is blank are not allocated (the old loops skipped them as well).
+# 'budget' is a number, or an array with the budget of every row, in which
+# case the first row of a group sets the budget of the group.
+# Returns the regular hours, the overtime hours, the allocated-row mask and
+# the mask of rows that found the budget already spent.
+def spend_budget(hours, keys, budget):
+    hours = hours.astype(float)
+    grouped = hours.groupby(keys, sort=False, observed=True)
+    group = grouped.ngroup().to_numpy(dtype=float, na_value=-1)
+    rank = grouped.cumcount().to_numpy(dtype=float, na_value=-1)
+    allocated = group >= 0
+
+    regular = np.zeros(len(hours))
+    overtime = np.zeros(len(hours))
+    exhausted = np.zeros(len(hours), dtype=bool)
+    values = hours.to_numpy()
+
+    rows = np.flatnonzero(allocated)
+    group = group[rows].astype(np.int64)
+    rank = rank[rows].astype(np.int64)
+
+    # The first ticket of every group is handled together, then the second one
+    # and so on, so the remaining budget is subtracted in the same order and
+    # with the same arithmetic as the old per-row loops
+    if np.ndim(budget):
+        first = np.unique(group, return_index=True)[1]
+        needed = np.asarray(budget, dtype=float)[rows[first]]
+    else:
+        needed = np.full(group.max() + 1 if len(group) else 0, float(budget))
+    order = np.argsort(rank, kind='stable')
+    bounds = np.searchsorted(rank[order], np.arange(rank.max() + 2 if len(rank) else 1))
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        step = rows[order[start:end]]
+        step_group = group[order[start:end]]
+        step_hours = values[step]
+        step_needed = needed[step_group]
+
+        spent = step_needed == 0
+        fits = ~spent & (step_needed >= step_hours)
+
+        regular[step] = np.where(spent, 0, np.where(fits, step_hours, step_needed))
+        overtime[step] = np.where(spent, step_hours, np.where(fits, 0, step_hours - step_needed))
+        exhausted[step] = spent
+        needed[step_group] = np.where(fits, step_needed - step_hours, 0)
+
+    return (pd.Series(regular, index=hours.index),
+            pd.Series(overtime, index=hours.index),
+            pd.Series(allocated, index=hours.index),
+            pd.Series(exhausted, index=hours.index))
+
+
+# Daily 8 hour split: the tickets of an employee on the same day are
+# spent against the budget in the order they appear in the frame.
+# The budget is a number of hours or the column holding it.
+def allocate_daily_overtime(df, hours_column='Lunch Adjusted', budget=8):
+    keys = [df['Employee Name'], df['Ticket Date'].dt.normalize()]
+    regular, overtime, allocated, spent = spend_budget(df[hours_column], keys, row_budget(df, budget))
+
+    # Rows that were never allocated keep no overtime
+    return overtime.where(allocated, 0.0)
+
+
+# Weekly 40 hour split: every employee gets a budget per payroll week, and
+# the days of the week are spent against it in date order, the tickets of a
+# day in the order they appear.
+# Rows without an employee or a date keep their current 'Regular Time' and
+# get no overtime. The budget is a number of hours or the column holding it.
+def allocate_weekly_time(df, hours_column='Lunch Adjusted', budget=40, week_start=WEEK_START):
+    dates = df['Ticket Date'].dt.normalize()
+    names = df['Employee Name'].where(dates.notna())
+    weeks = week_of(dates, week_start)
+
+    # A stable sort on the date keeps the ticket order within the day
+    order = np.argsort(dates.to_numpy(), kind='stable')
+    budget = row_budget(df, budget)
+    regular, overtime, allocated, spent = spend_budget(
+        df[hours_column].iloc[order], [names.iloc[order], weeks.iloc[order]],
+        budget[order] if np.ndim(budget) else budget)
+
+    weekly = pd.DataFrame({'Regular Time': df['Regular Time'].to_numpy(dtype=float),
+                           'Overtime': 0.0}, index=df.index)
+    allocated = allocated.to_numpy()
+    weekly.iloc[order[allocated], 0] = regular.to_numpy()[allocated]
+    weekly.iloc[order[allocated], 1] = overtime.to_numpy()[allocated]
+    return weekly
@@ -0,0 +1,174 @@
+import argparse
+import csv
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from Payroll_Allocation import WEEK_DAYS, WEEK_START
+from Payroll_Incremental import run_payroll_incremental
+from Payroll_Instrument import STAGES
+from Payroll_Pipeline import run_payroll
+from Payroll_Rules import load_rules
+from Payroll_Stream import run_payroll_streaming, SPILL_PARTITIONS
+
+# Columns of a manifest: one clock-in/ticket file pair and its output directory per line
+MANIFEST_COLUMNS = ['clockIn_File', 'payRoll_File', 'output_directory']
+
+
+# Read a manifest CSV. Relative paths are taken from the manifest's directory.
+def read_manifest(path):
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in MANIFEST_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError("Manifest %s is missing the columns: %s" % (path, ', '.join(missing)))
+
+        jobs = []
+        for row in reader:
+            if not any((row[column] or '').strip() for column in MANIFEST_COLUMNS):
+                continue
+            jobs.append(tuple(os.path.join(base, row[column].strip()) for column in MANIFEST_COLUMNS))
+    return jobs
+
+
+# Run one payroll; returns the error text instead of raising so one bad
+# pair does not stop the rest of the batch. An incremental run reuses the
+# run state kept in the output directory; with 'partitions' the run streams
+# the exports through that many employee partitions spilled to disk.
+# 'io_workers' processes read the exports and write the workbooks of the run.
+# With a 'store_file' the run is also kept in that timesheet store.
+# A full run can split its employees over 'shard_workers' processes.
+def run_job(clockIn_File, payRoll_File, output_directory, rounding=False, week_start=WEEK_START, week_workers=1,
+            incremental=False, cache_directory=None, run_report=False, profile_stage=None, partitions=None,
+            spill_directory=None, rules=None, io_workers=1, store_file=None, shard_workers=1):
+    start = time.perf_counter()
+    try:
+        os.makedirs(output_directory, exist_ok=True)
+        if partitions:
+            run_payroll_streaming(clockIn_File, payRoll_File, output_directory, rounding, week_start, week_workers,
+                                  partitions, spill_directory, run_report, profile_stage, rules, io_workers,
+                                  store_file)
+        elif incremental:
+            run_payroll_incremental(clockIn_File, payRoll_File, output_directory, rounding, week_start, week_workers,
+                                    cache_directory, run_report=run_report, profile_stage=profile_stage, rules=rules,
+                                    io_workers=io_workers, store_file=store_file)
+        else:
+            run_payroll(clockIn_File, payRoll_File, output_directory, rounding, week_start, week_workers,
+                        cache_directory, run_report, profile_stage, rules, io_workers, store_file, shard_workers)
+    except Exception:
+        return output_directory, time.perf_counter() - start, traceback.format_exc()
+    return output_directory, time.perf_counter() - start, None
+
+
+# Print the outcome of a job and keep track of the failed ones
+def report(result, failed):
+    output_directory, seconds, error = result
+    if error:
+        failed.append(output_directory)
+        print("FAILED %s after %.2f seconds:\n%s" % (output_directory, seconds, error))
+    else:
+        print("Done %s in %.2f seconds" % (output_directory, seconds))
+
+
+# Run every job of a manifest on a process pool. Returns the failed jobs.
+# A single run can spread its payroll weeks over 'week_workers' processes,
+# its reads and writes over 'io_workers' and its employees over 'shard_workers'.
+def run_batch(jobs, workers=None, rounding=False, week_start=WEEK_START, week_workers=1, incremental=False,
+              cache_directory=None, run_report=False, profile_stage=None, partitions=None, spill_directory=None,
+              rules=None, io_workers=1, store_file=None, shard_workers=1):
+    failed = []
+    if workers == 1:
+        for job in jobs:
+            report(run_job(*job, rounding, week_start, week_workers, incremental, cache_directory, run_report,
+                           profile_stage, partitions, spill_directory, rules, io_workers, store_file,
+                           shard_workers), failed)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_job, *job, rounding, week_start, 1, incremental, cache_directory,
+                                       run_report, profile_stage, partitions, spill_directory, rules, 1, store_file,
+                                       1)
+                       for job in jobs]
+            for future in as_completed(futures):
+                report(future.result(), failed)
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the payroll for many clock-in/ticket file pairs.")
+    parser.add_argument('manifest', nargs='?',
+                        help="CSV with the columns %s" % ', '.join(MANIFEST_COLUMNS))
+    parser.add_argument('--clock-in', help="Clock-in export of a single run (instead of a manifest)")
+    parser.add_argument('--tickets', help="Ticket export of a single run")
+    parser.add_argument('--output', help="Output directory of a single run")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Number of worker processes (default: one per CPU, 1 runs in this process)")
+    parser.add_argument('--rounding', action='store_true', help="Round the punches (7 minute rule)")
+    parser.add_argument('--week-start', default=WEEK_START, choices=WEEK_DAYS,
+                        help="First day of the payroll week (default: %(default)s, ISO weeks)")
+    parser.add_argument('--week-workers', type=int, default=1,
+                        help="Processes that compute the payroll weeks of a run; used with --workers 1")
+    parser.add_argument('--io-workers', type=int, default=1,
+                        help="Processes that read the two exports and write the workbooks of a run at the same "
+                             "time; used with --workers 1")
+    parser.add_argument('--shard-workers', type=int, default=1,
+                        help="Processes that allocate and validate the employees of a run, split by a hash of the "
+                             "employee name; used with --workers 1, not with --incremental or --stream")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Only recompute the employee-weeks that changed since the last run of an output directory")
+    parser.add_argument('--cache', metavar='DIRECTORY',
+                        help="Keep the parsed and merged exports in this directory to skip Excel on reruns")
+    parser.add_argument('--report', action='store_true',
+                        help="Write the time, rows and memory of every stage to run_report.json in the output "
+                             "directory")
+    parser.add_argument('--profile', choices=STAGES,
+                        help="Also profile one stage with cProfile (implies --report)")
+    parser.add_argument('--stream', action='store_true',
+                        help="Read the exports in chunks and process them by employee partition, for exports "
+                             "too large for memory")
+    parser.add_argument('--partitions', type=int, default=SPILL_PARTITIONS,
+                        help="Employee partitions of a streaming run (default: %(default)s)")
+    parser.add_argument('--spill', metavar='DIRECTORY',
+                        help="Where a streaming run keeps its partition files (default: the temp directory)")
+    parser.add_argument('--rules', metavar='FILE',
+                        help="JSON file of overtime rules per agency or client (see Payroll_Rules.py)")
+    parser.add_argument('--store', metavar='FILE',
+                        help="Also keep the punches, tickets and allocations of every run in this SQLite timesheet "
+                             "store (see Payroll_Store.py)")
+    args = parser.parse_args(argv)
+
+    if args.stream and (args.incremental or args.cache):
+        parser.error("--stream cannot be combined with --incremental or --cache")
+    if args.shard_workers > 1 and (args.stream or args.incremental):
+        parser.error("--shard-workers cannot be combined with --stream or --incremental")
+    # The runs of a pool share its processes, so each runs in one process
+    ignored = [flag for flag, value in (('--week-workers', args.week_workers), ('--io-workers', args.io_workers),
+                                        ('--shard-workers', args.shard_workers)) if value != 1]
+    if args.workers != 1 and ignored:
+        parser.error("%s can only be used with --workers 1" % ', '.join(ignored))
+
+    if args.manifest:
+        jobs = read_manifest(args.manifest)
+    elif args.clock_in and args.tickets and args.output:
+        jobs = [(args.clock_in, args.tickets, args.output)]
+    else:
+        parser.error("give a manifest or --clock-in, --tickets and --output")
+
+    try:
+        rules = load_rules(args.rules) if args.rules else None
+    except (OSError, ValueError) as e:
+        parser.error("cannot use the rules in %s: %s" % (args.rules, e))
+
+    start = time.perf_counter()
+    failed = run_batch(jobs, args.workers, args.rounding, args.week_start, args.week_workers, args.incremental,
+                       args.cache, args.report, args.profile, args.partitions if args.stream else None, args.spill,
+                       rules, args.io_workers, args.store, args.shard_workers)
+    print("%d of %d payroll runs done in %.2f seconds" % (
+        len(jobs) - len(failed), len(jobs), time.perf_counter() - start))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
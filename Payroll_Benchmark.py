@@ -0,0 +1,189 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Payroll_Allocation import allocate_daily_overtime, WEEK_START
+from Payroll_Encoding import encode
+from Payroll_Generate import generate, employees_for, write_exports, EXCEL_ROWS
+from Payroll_Ingest import ingest, CLOCK_IN_DATES, TICKET_COLUMNS, TICKET_DATES
+from Payroll_Pipeline import merge, allocate, allocate_weeks, resume_weeks, validate, render
+
+# Stages timed by a run, in pipeline order
+STAGES = ['ingest', 'merge', 'daily_allocation', 'weekly_allocation', 'allocate', 'errors', 'resume', 'render']
+
+# Default workload sizes, in punches
+DEFAULT_ROWS = [1000, 10000, 100000]
+
+
+# Short hash of the checked out commit, or None outside a git checkout
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Generated frames shaped like the output of ingest: the ticket columns the
+# pipeline reads, parsed dates and the text columns encoded
+def as_ingested(clock_in_df, tickets_df):
+    df1 = clock_in_df.copy()
+    df2 = tickets_df[TICKET_COLUMNS].copy()
+    for df, dates in ((df1, CLOCK_IN_DATES), (df2, TICKET_DATES)):
+        for column in dates:
+            df[column] = pd.to_datetime(df[column])
+    encode(df1, df2)
+    return df1, df2
+
+
+# Run the stages once on a workload. 'measure' is called around every stage
+# with its name and a function running it, and returns what the stage gives.
+# Ingest and render need the Excel files, so they are skipped when the
+# workload does not fit in a sheet.
+def run_stages(measure, clock_in_df, tickets_df, directory, excel, week_start=WEEK_START):
+    if excel:
+        clockIn_File = os.path.join(directory, 'clockin.xlsx')
+        payRoll_File = os.path.join(directory, 'tickets.xlsx')
+        write_exports(clock_in_df, tickets_df, clockIn_File, payRoll_File)
+        df1, df2 = measure('ingest', lambda: ingest(clockIn_File, payRoll_File))
+    else:
+        df1, df2 = as_ingested(clock_in_df, tickets_df)
+
+    merged_df, duplicates_df = measure('merge', lambda: merge(df1, df2))
+    del df1, df2
+
+    # The two allocations on their own, on a copy as allocate adds columns
+    daily_df = merged_df.copy(deep=False)
+    daily_df['Regular Time'] = daily_df['Lunch Adjusted'].where(daily_df['Lunch Adjusted'] <= 8, other=8)
+    measure('daily_allocation', lambda: allocate_daily_overtime(daily_df))
+    measure('weekly_allocation', lambda: allocate_weeks(daily_df, week_start))
+    del daily_df
+
+    merged_df, payroll_df, merged_weekly_df = measure('allocate', lambda: allocate(merged_df, week_start))
+    errors_df, weekly_errors_df = measure('errors', lambda: validate(merged_df, merged_weekly_df))
+    measure('resume', lambda: resume_weeks(merged_weekly_df, week_start))
+
+    if excel:
+        output_directory = os.path.join(directory, 'output')
+        os.makedirs(output_directory, exist_ok=True)
+        measure('render', lambda: render(output_directory, merged_df, payroll_df, errors_df, merged_weekly_df,
+                                         weekly_errors_df, week_start, duplicates_df=duplicates_df))
+
+
+# Time every stage: wall clock and CPU seconds
+def time_stages(*args, **kwargs):
+    results = {}
+
+    def measure(stage, function):
+        wall, cpu = time.perf_counter(), time.process_time()
+        value = function()
+        results[stage] = {'seconds': round(time.perf_counter() - wall, 4),
+                          'cpu_seconds': round(time.process_time() - cpu, 4)}
+        return value
+
+    run_stages(measure, *args, **kwargs)
+    return results
+
+
+# Peak memory allocated by every stage, traced in a separate pass as tracing
+# slows the stages down
+def trace_stages(*args, **kwargs):
+    results = {}
+
+    def measure(stage, function):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        value = function()
+        results[stage] = {'peak_mb': round((tracemalloc.get_traced_memory()[1] - before) / 1e6, 2)}
+        return value
+
+    tracemalloc.start()
+    try:
+        run_stages(measure, *args, **kwargs)
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+# Benchmark the pipeline on a generated workload of about 'rows' punches
+def benchmark(rows, days=14, tickets_per_day=3, duplicate_rate=0.02, missing_rate=0.03, seed=0,
+              week_start=WEEK_START, memory=True, directory=None):
+    employees = employees_for(rows, days, tickets_per_day)
+    start = time.perf_counter()
+    clock_in_df, tickets_df = generate(employees, days, tickets_per_day, duplicate_rate, missing_rate, seed=seed)
+    generated = time.perf_counter() - start
+
+    excel = max(len(clock_in_df), len(tickets_df)) <= EXCEL_ROWS
+    print("%d punches, %d tickets for %d employees (generated in %.2f seconds)" % (
+        len(clock_in_df), len(tickets_df), employees, generated))
+
+    with tempfile.TemporaryDirectory(dir=directory) as work_directory:
+        stages = time_stages(clock_in_df, tickets_df, work_directory, excel, week_start)
+        if memory:
+            for stage, result in trace_stages(clock_in_df, tickets_df, work_directory, excel, week_start).items():
+                stages[stage].update(result)
+
+    for stage in STAGES:
+        if stage in stages:
+            print("  %-18s %8.3f s" % (stage, stages[stage]['seconds']) +
+                  ("  %9.1f MB" % stages[stage]['peak_mb'] if 'peak_mb' in stages[stage] else ''))
+        else:
+            print("  %-18s  skipped" % stage)
+
+    return {
+        'rows': rows,
+        'params': {'employees': employees, 'days': days, 'tickets_per_day': tickets_per_day,
+                   'duplicate_rate': duplicate_rate, 'missing_rate': missing_rate, 'seed': seed,
+                   'week_start': week_start},
+        'clock_in_rows': len(clock_in_df),
+        'ticket_rows': len(tickets_df),
+        'generate_seconds': round(generated, 4),
+        'skipped': [] if excel else [{'stage': stage, 'reason': 'more rows than an Excel sheet holds (%d)' % EXCEL_ROWS}
+                                     for stage in ('ingest', 'render')],
+        'stages': stages,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the payroll stages on generated workloads.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="Workload sizes in punches (default: %(default)s)")
+    parser.add_argument('--output', default='benchmark.json', help="JSON file of the results")
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--tickets-per-day', type=float, default=3)
+    parser.add_argument('--duplicate-rate', type=float, default=0.02)
+    parser.add_argument('--missing-rate', type=float, default=0.03)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--week-start', default=WEEK_START)
+    parser.add_argument('--no-memory', action='store_true', help="Skip the memory tracing pass")
+    parser.add_argument('--directory', help="Where the generated workbooks are written (default: a temp directory)")
+    args = parser.parse_args(argv)
+
+    runs = [benchmark(rows, args.days, args.tickets_per_day, args.duplicate_rate, args.missing_rate, args.seed,
+                      args.week_start, not args.no_memory, args.directory) for rows in args.rows]
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'runs': runs,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print("Results written to %s" % args.output)
+
+
+if __name__ == '__main__':
+    main()
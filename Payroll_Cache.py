@@ -0,0 +1,169 @@
+import hashlib
+import importlib.util
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Bump when the parsed or merged frames change shape, so old entries are not reused
+SCHEMA_VERSION = 3
+
+# Oldest entries are evicted once the cache grows past this size
+CACHE_SIZE_LIMIT = 512 * 1024 * 1024
+
+# Frames are kept as uncompressed Arrow IPC files (pip install pyarrow), which
+# are read through a memory map; without pyarrow, or for columns Arrow cannot
+# hold, they are pickled
+ARROW_EXTENSION = '.arrow'
+PICKLE_EXTENSION = '.pkl'
+
+
+# Whether pyarrow is installed
+def has_arrow():
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+# Hash of the contents of a file; a file is read once per run as long as its
+# size and modification time stay the same
+def file_hash(path):
+    stat = os.stat(path)
+    return contents_hash(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+@lru_cache(maxsize=64)
+def contents_hash(path, size, modified, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Cache key of a frame: what it is, the hashes of the files it comes from and
+# the settings it was built with
+def cache_key(kind, paths, *settings):
+    digest = hashlib.sha256(('%s|%d' % (kind, SCHEMA_VERSION)).encode())
+    for path in paths:
+        digest.update(file_hash(path).encode())
+    digest.update(repr(settings).encode())
+    return '%s-%s' % (kind, digest.hexdigest()[:32])
+
+
+# File of a cache entry, or None when there is none
+def entry_path(cache_directory, key):
+    for extension in (ARROW_EXTENSION, PICKLE_EXTENSION):
+        path = os.path.join(cache_directory, key + extension)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+# Write a frame, its index included, as an Arrow IPC file
+def write_arrow(path, df):
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    with ipc.new_file(path, table.schema) as writer:
+        writer.write_table(table)
+
+
+# Read an Arrow IPC file through a memory map. The Arrow table only refers
+# to the mapped file, but to_pandas copies every column into the frame, so a
+# hit is still one full read of the file into memory.
+def read_arrow(path):
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    with pa.memory_map(path) as source:
+        df = ipc.open_file(source).read_all().to_pandas()
+
+    # Blanks of text columns come back as None; read_excel gives NaN
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+# Load a cached frame, or None when it is not in the cache
+def load_frame(cache_directory, key):
+    path = entry_path(cache_directory, key)
+    if path is None:
+        return None
+    try:
+        df = read_arrow(path) if path.endswith(ARROW_EXTENSION) else pd.read_pickle(path)
+    except Exception as e:
+        print("Ignoring the cache entry %s: %s" % (path, e))
+        return None
+
+    # Mark the entry as recently used
+    os.utime(path)
+    return df
+
+
+# Store a frame in the cache, then evict the least recently used entries
+# over the size limit
+def store_frame(cache_directory, key, df, size_limit=CACHE_SIZE_LIMIT):
+    os.makedirs(cache_directory, exist_ok=True)
+    path = os.path.join(cache_directory, key)
+    try:
+        if not has_arrow():
+            raise ImportError('pyarrow is not installed')
+        write_arrow(path + ARROW_EXTENSION + '.tmp', df)
+        os.replace(path + ARROW_EXTENSION + '.tmp', path + ARROW_EXTENSION)
+    except Exception:
+        if os.path.exists(path + ARROW_EXTENSION + '.tmp'):
+            os.remove(path + ARROW_EXTENSION + '.tmp')
+        df.to_pickle(path + PICKLE_EXTENSION + '.tmp')
+        os.replace(path + PICKLE_EXTENSION + '.tmp', path + PICKLE_EXTENSION)
+
+    evict(cache_directory, size_limit)
+
+
+# Remove the least recently used entries until the cache fits in 'size_limit'
+def evict(cache_directory, size_limit=CACHE_SIZE_LIMIT):
+    entries = []
+    for name in os.listdir(cache_directory):
+        if name.endswith((ARROW_EXTENSION, PICKLE_EXTENSION)):
+            try:
+                stat = os.stat(os.path.join(cache_directory, name))
+            except OSError:
+                # Evicted by another process at the same time
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for used, size, name in entries)
+    for used, size, name in sorted(entries):
+        if total <= size_limit:
+            break
+        try:
+            os.remove(os.path.join(cache_directory, name))
+            total -= size
+        except OSError:
+            # Still mapped by this process (Windows)
+            pass
+
+
+# Load a frame from the cache, or build and store it. Without a cache
+# directory the frame is always built. Returns the frame and whether it came
+# from the cache.
+def cached_frame(cache_directory, kind, paths, settings, build):
+    frames, cached = cached_frames(cache_directory, kind, paths, settings, lambda: (build(),), 1)
+    return frames[0], cached
+
+
+# Same as cached_frame for a build that returns 'count' frames
+def cached_frames(cache_directory, kind, paths, settings, build, count):
+    if cache_directory is None:
+        return build(), False
+
+    key = cache_key(kind, paths, *settings)
+    keys = [key] if count == 1 else ['%s-%d' % (key, number) for number in range(count)]
+    frames = [load_frame(cache_directory, frame_key) for frame_key in keys]
+    if all(df is not None for df in frames):
+        return tuple(frames), True
+
+    frames = build()
+    for frame_key, df in zip(keys, frames):
+        store_frame(cache_directory, frame_key, df)
+    return frames, False
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+# Where the payroll service listens (python Payroll_Service.py). Only the
+# local machine can reach it.
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+SERVICE_URL = 'http://%s:%d' % (SERVICE_HOST, SERVICE_PORT)
+
+# File the service writes its token to when it starts; only the user running
+# it can read the file, and every request must carry the token
+SERVICE_TOKEN_FILE = os.path.join(os.path.expanduser('~'), '.payroll-service-token')
+
+# Options of a job that hold paths
+PATH_OPTIONS = ['clock_in', 'tickets', 'output', 'cache', 'rules', 'roster', 'store']
+
+
+# Token of the service, or None when it has not written one
+def read_token(token_file=SERVICE_TOKEN_FILE):
+    try:
+        with open(token_file) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+# Send a request to the service; returns its JSON answer. A failed run comes
+# back as an answer with an 'error'; a service that cannot be reached raises
+# an OSError.
+def request(path, job=None, url=SERVICE_URL, timeout=None, token_file=SERVICE_TOKEN_FILE):
+    data = None if job is None else json.dumps(job).encode()
+    headers = {'Content-Type': 'application/json', 'Authorization': 'Bearer %s' % (read_token(token_file) or '')}
+    call = urllib.request.Request(url + path, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(call, timeout=timeout) as answer:
+            return json.load(answer)
+    except urllib.error.HTTPError as e:
+        return json.load(e)
+
+
+# Run a payroll on the service. 'job' holds the paths and options of the
+# run, named as in Payroll_Service.JOB_OPTIONS.
+def submit(job, url=SERVICE_URL, timeout=None, token_file=SERVICE_TOKEN_FILE):
+    return request('/run', job, url, timeout, token_file)
+
+
+# Workers, jobs run and uptime of the service
+def status(url=SERVICE_URL, timeout=5, token_file=SERVICE_TOKEN_FILE):
+    return request('/status', url=url, timeout=timeout, token_file=token_file)
+
+
+# Print the outcome of a run. Returns False when it failed.
+def print_result(result):
+    if result.get('error'):
+        print("FAILED %s:\n%s" % (result.get('output_directory', ''), result['error']))
+        return False
+
+    print("Done %s in %.2f seconds" % (result['output_directory'], result['seconds']))
+    for path in result['outputs']:
+        print("  %s" % path)
+    for stage in (result.get('report') or {}).get('stages', []):
+        print("  %-10s %8.3f s" % (stage['stage'], stage['seconds']))
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a payroll on the payroll service.")
+    parser.add_argument('--clock-in', help="Clock-in export")
+    parser.add_argument('--tickets', help="Ticket export")
+    parser.add_argument('--output', help="Output directory")
+    parser.add_argument('--rounding', action='store_true', help="Round the punches (7 minute rule)")
+    parser.add_argument('--week-start', help="First day of the payroll week")
+    parser.add_argument('--incremental', action='store_true')
+    parser.add_argument('--cache', metavar='DIRECTORY')
+    parser.add_argument('--stream', action='store_true')
+    parser.add_argument('--partitions', type=int)
+    parser.add_argument('--rules', metavar='FILE')
+    parser.add_argument('--roster', metavar='FILE', help="Also list the employees missing from this roster")
+    parser.add_argument('--io-workers', type=int)
+    parser.add_argument('--store', metavar='FILE', help="Also keep the run in this timesheet store")
+    parser.add_argument('--shard-workers', type=int)
+    parser.add_argument('--url', default=SERVICE_URL, help="Service address (default: %(default)s)")
+    parser.add_argument('--token-file', default=SERVICE_TOKEN_FILE,
+                        help="Token the service wrote when it started (default: %(default)s)")
+    parser.add_argument('--status', action='store_true', help="Only print the status of the service")
+    args = parser.parse_args(argv)
+    if not args.status and not (args.clock_in and args.tickets and args.output):
+        parser.error("give --clock-in, --tickets and --output, or --status")
+
+    try:
+        if args.status:
+            print(json.dumps(status(args.url, token_file=args.token_file), indent=2))
+            return 0
+
+        job = {'clock_in': args.clock_in, 'tickets': args.tickets, 'output': args.output,
+               'rounding': args.rounding, 'week_start': args.week_start, 'incremental': args.incremental,
+               'cache': args.cache, 'stream': args.stream, 'partitions': args.partitions, 'rules': args.rules,
+               'roster': args.roster, 'io_workers': args.io_workers, 'store': args.store,
+               'shard_workers': args.shard_workers}
+        # The service runs in another directory
+        for key in PATH_OPTIONS:
+            if job[key]:
+                job[key] = os.path.abspath(job[key])
+        result = submit({key: value for key, value in job.items() if value not in (None, False)}, args.url,
+                        token_file=args.token_file)
+    except OSError as e:
+        print("Cannot reach the payroll service at %s (%s); start it with python Payroll_Service.py" % (args.url, e))
+        return 2
+    return 0 if print_result(result) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
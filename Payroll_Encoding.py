@@ -0,0 +1,59 @@
+import pandas as pd
+
+# Text columns repeated on every punch and ticket. They are carried as
+# categoricals from ingest to render: every value is stored once and the
+# groupbys work on the integer codes.
+CATEGORY_COLUMNS = ['Employee Name', 'Agency', 'Supervisors Name', 'PM Assigned', 'JobNo|Customer|Description',
+                    'Email', 'Day of the Week']
+
+
+# Sorted categories of the values of one or more columns, so grouping on the
+# codes gives the same order as grouping on the text
+def sorted_categories(*columns):
+    values = pd.Index(pd.concat([pd.Series(column, dtype=object) for column in columns]).dropna().unique())
+    try:
+        return values.sort_values()
+    except TypeError:
+        # Text mixed with numbers: keep the order of appearance
+        return values
+
+
+# Encode a column as a categorical (a column that already is one is re-coded
+# to the given categories)
+def encode_column(column, categories=None):
+    if categories is None:
+        categories = sorted_categories(column)
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.set_categories(categories)
+    return pd.Series(pd.Categorical(column, categories=categories), index=column.index, name=column.name)
+
+
+# Encode the text columns of the frames, in place. A column found in several
+# frames gets the same categories in all of them, so joining on it compares codes.
+def encode(*frames):
+    for column in CATEGORY_COLUMNS:
+        holders = [df for df in frames if column in df.columns]
+        if not holders:
+            continue
+        categories = sorted_categories(*[df[column] for df in holders])
+        for df in holders:
+            df[column] = encode_column(df[column], categories)
+
+
+# Fill the blanks of a column; a categorical gets the fill value as a category,
+# kept in sorted order
+def fill_blanks(column, value):
+    if isinstance(column.dtype, pd.CategoricalDtype) and value not in column.cat.categories:
+        column = column.cat.set_categories(sorted_categories(column.cat.categories, [value]))
+    return column.fillna(value)
+
+
+# Decode the categorical columns back to text for display
+def decode(df):
+    columns = [column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)]
+    if not columns:
+        return df
+    df = df.copy(deep=False)
+    for column in columns:
+        df[column] = df[column].astype(object)
+    return df
@@ -0,0 +1,207 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from Payroll_Render import write_workbook
+
+# Rows that fit in an Excel sheet under its header
+EXCEL_ROWS = 1048575
+
+# Share of the employees punching in on a week day and on a weekend day
+WEEKDAY_ATTENDANCE = 0.9
+WEEKEND_ATTENDANCE = 0.15
+
+# Pools the generated values are taken from, shaped like Test2.xlsx
+FIRST_NAMES = ['Alan', 'Juan', 'Fernando', 'Brayan', 'Maria', 'Jose', 'Luis', 'Carlos', 'Ana', 'Miguel', 'David',
+               'Jorge', 'Pedro', 'Rosa', 'Daniel', 'Chris', 'Wayne', 'Michael', 'Kevin', 'Laura']
+LAST_NAMES = ['Cruz', 'Silva', 'Badillo', 'Hughes', 'Hodnett', 'Magenheimer', 'Tolleson', 'Garcia', 'Martinez',
+              'Lopez', 'Gonzalez', 'Perez', 'Sanchez', 'Ramirez', 'Torres', 'Flores', 'Rivera', 'Gomez', 'Diaz',
+              'Reyes']
+CUSTOMERS = ['Barry-Wehmiller Design Group', 'Emergent Construction Technologies', 'Alabama Power Company',
+             'Mercedes-Benz US International', 'Nucor Steel Tuscaloosa', 'Hyundai Motor Manufacturing']
+SITES = ['3450 MET Expansion Phase II', 'ALDOT Bridge Retrofit', 'Plant Barry Unit 5 Outage',
+         'Body Shop Conveyor Upgrade', 'Melt Shop Baghouse Replacement', 'Paint Shop Controls Migration']
+AGENCIES = ['ECO Staffing', 'Outsource.net', 'Talent Corp', 'Proman Skilled Trades', None]
+AGENCY_WEIGHTS = [0.33, 0.2, 0.07, 0.06, 0.34]
+SUPERVISORS = ['Magenheimer, Wayne', 'Hughes, Chris', 'Tolleson, Michael', 'Hodnett, Daniel', 'Cruz, Juan',
+               'Silva, Fernando', 'Badillo, Brayan', None]
+PROJECT_MANAGERS = ['Hughes, Chris', 'Hodnett, Daniel', 'Tolleson, Michael', None]
+
+# Columns of the generated exports
+CLOCK_IN_COLUMNS = ['Ticket Date', 'Employee Name', 'Clock In', 'Clock Out', 'Hours Worked',
+                    'JobNo|Customer|Description', 'Email']
+TICKET_COLUMNS = ['Ticket Date', 'JobNo|Customer|Description', 'Employee Name', 'Employee ID', 'Clock-In ID',
+                  'Agency', 'Actual Hrs', 'Retrieved Status', 'Temp Agency Name', 'Supervisors Name', 'PM Assigned',
+                  'WTL Approved', 'WTL Start Date', 'WTL End Date', 'ApprovedOvertime', 'ApprovedOvertime Start Date',
+                  'ApprovedOvertime End Date']
+
+
+# Categorical column of 'size' values drawn from a pool; None in the pool
+# stands for a blank. Categoricals keep millions of rows small.
+def pick(pool, size, rng, p=None):
+    values = [value for value in pool if value is not None]
+    lookup = np.array([values.index(value) if value is not None else -1 for value in pool])
+    return pd.Categorical.from_codes(lookup[rng.choice(len(pool), size, p=p)], values)
+
+
+# Job descriptions: 'number | customer | site'
+def job_names(count, rng):
+    return np.array(['%d | %s | %s' % (4000 + number, CUSTOMERS[rng.integers(len(CUSTOMERS))],
+                                        SITES[rng.integers(len(SITES))]) for number in range(count)], dtype=object)
+
+
+# Employee names: 'Last, First', numbered once the pools run out
+def employee_names(count):
+    names = []
+    for number in range(count):
+        first = FIRST_NAMES[number % len(FIRST_NAMES)]
+        last = LAST_NAMES[(number // len(FIRST_NAMES)) % len(LAST_NAMES)]
+        cycle = number // (len(FIRST_NAMES) * len(LAST_NAMES))
+        names.append('%s, %s' % (last, first) if cycle == 0 else '%s, %s %d' % (last, first, cycle + 1))
+    return np.array(names, dtype=object)
+
+
+# Expected number of punches for a workload
+def expected_rows(employees, days, tickets_per_day, start='2023-06-05'):
+    weekdays = pd.date_range(start, periods=days).dayofweek
+    attendance = np.where(weekdays < 5, WEEKDAY_ATTENDANCE, WEEKEND_ATTENDANCE).sum()
+    return int(round(employees * attendance * tickets_per_day))
+
+
+# Employees needed for about 'rows' punches
+def employees_for(rows, days, tickets_per_day, start='2023-06-05'):
+    return max(1, int(round(rows / max(expected_rows(1, days, tickets_per_day, start), 1e-9))))
+
+
+# Generate a clock-in export and a ticket export.
+# Every employee works most week days and a few weekend days, with about
+# 'tickets_per_day' jobs a day punched back to back. 'missing_rate' of the
+# punches lose their Clock In or Clock Out, 'duplicate_rate' of the tickets
+# (and a quarter as many punches) are exported twice, and a few punches have
+# no ticket at all.
+def generate(employees=100, days=14, tickets_per_day=3, duplicate_rate=0.02, missing_rate=0.03,
+             start='2023-06-05', seed=0):
+    rng = np.random.default_rng(seed)
+    names = employee_names(employees)
+    jobs = job_names(max(8, int(tickets_per_day) * 4), rng)
+    dates = pd.date_range(start, periods=days).to_numpy()
+
+    # Days worked by every employee
+    employee, day = np.divmod(np.arange(employees * days), days)
+    weekend = pd.DatetimeIndex(dates[day]).dayofweek >= 5
+    works = rng.random(len(day)) < np.where(weekend, WEEKEND_ATTENDANCE, WEEKDAY_ATTENDANCE)
+    employee, day = employee[works], day[works]
+
+    # Tickets of every day worked, each on another job
+    counts = np.maximum(1, rng.poisson(tickets_per_day, len(day)))
+    counts = np.minimum(counts, len(jobs))
+    row_employee = np.repeat(employee, counts)
+    row_day = np.repeat(day, counts)
+    starts = np.cumsum(counts) - counts
+    rank = np.arange(counts.sum()) - np.repeat(starts, counts)
+    job = (np.repeat(rng.integers(len(jobs), size=len(day)), counts) + rank) % len(jobs)
+
+    # Punches back to back from 6 to 7 in the morning, 9 hours a day on average
+    durations = rng.gamma(4, 9 * 3600 / 4 / np.repeat(counts, counts)).astype(np.int64)
+    ends = np.cumsum(durations)
+    day_offset = np.repeat(ends[starts] - durations[starts], counts)
+    first_punch = np.repeat(6 * 3600 + rng.integers(0, 3600, len(day)), counts)
+    clock_in = dates[row_day] + ((first_punch + ends - durations - day_offset) * 1000000000).astype('timedelta64[ns]')
+    clock_out = clock_in + (durations * 1000000000).astype('timedelta64[ns]')
+
+    missing = rng.random(len(rank)) < missing_rate
+    missing_in = missing & (rng.random(len(rank)) < 0.5)
+    missing_out = missing & ~missing_in
+    clock_in = np.where(missing_in, np.datetime64('NaT'), clock_in)
+    clock_out = np.where(missing_out, np.datetime64('NaT'), clock_out)
+    hours = np.where(missing, np.nan, np.round(durations / 3600, 2))
+
+    emails = ['employee%d@example.com' % number for number in range(employees)]
+    clock_in_df = pd.DataFrame({
+        'Ticket Date': dates[row_day],
+        'Employee Name': pd.Categorical.from_codes(row_employee, names),
+        'Clock In': clock_in,
+        'Clock Out': clock_out,
+        'Hours Worked': hours,
+        'JobNo|Customer|Description': pd.Categorical.from_codes(job, jobs),
+        'Email': pd.Categorical.from_codes(row_employee, emails),
+    }, columns=CLOCK_IN_COLUMNS)
+
+    # Tickets: most punches have one, some are exported twice
+    ticketed = rng.random(len(rank)) < 0.95
+    tickets = np.flatnonzero(ticketed)
+    size = len(tickets)
+    ticket_date = dates[row_day[tickets]]
+    wtl = rng.random(size) < 0.1
+    approved = rng.random(size) < 0.2
+    agency = pick(AGENCIES, size, rng, AGENCY_WEIGHTS)
+    employee_id = row_employee[tickets].astype(float)
+    employee_id[rng.random(size) < 0.02] = np.nan
+
+    tickets_df = pd.DataFrame({
+        'Ticket Date': ticket_date,
+        'JobNo|Customer|Description': pd.Categorical.from_codes(job[tickets], jobs),
+        'Employee Name': pd.Categorical.from_codes(row_employee[tickets], names),
+        'Employee ID': employee_id,
+        'Clock-In ID': employee_id,
+        'Agency': agency,
+        'Actual Hrs': np.maximum(1, np.round(durations[tickets] / 3600)).astype(np.int64),
+        'Retrieved Status': pd.Categorical.from_codes(np.zeros(size, dtype=int), ['Pending']),
+        'Temp Agency Name': agency,
+        'Supervisors Name': pick(SUPERVISORS, size, rng),
+        'PM Assigned': pick(PROJECT_MANAGERS, size, rng),
+        'WTL Approved': pd.Categorical.from_codes(np.where(wtl, 0, -1), ['Yes']),
+        'WTL Start Date': np.where(wtl, ticket_date, np.datetime64('NaT')),
+        'WTL End Date': np.where(wtl, ticket_date, np.datetime64('NaT')),
+        'ApprovedOvertime': pd.Categorical.from_codes(np.where(approved, 0, -1), ['Yes']),
+        'ApprovedOvertime Start Date': np.where(approved, ticket_date, np.datetime64('NaT')),
+        'ApprovedOvertime End Date': np.where(approved, ticket_date, np.datetime64('NaT')),
+    }, columns=TICKET_COLUMNS)
+
+    # Exported twice: the copies follow their rows
+    tickets_df = with_duplicates(tickets_df, duplicate_rate, rng)
+    clock_in_df = with_duplicates(clock_in_df, duplicate_rate / 4, rng)
+    return clock_in_df, tickets_df
+
+
+# Repeat 'rate' of the rows right after themselves
+def with_duplicates(df, rate, rng):
+    repeats = 1 + (rng.random(len(df)) < rate)
+    return df.iloc[np.repeat(np.arange(len(df)), repeats)].reset_index(drop=True)
+
+
+# Write the generated exports as workbooks
+def write_exports(clock_in_df, tickets_df, clockIn_File, payRoll_File):
+    for df, path in ((clock_in_df, clockIn_File), (tickets_df, payRoll_File)):
+        if len(df) > EXCEL_ROWS:
+            raise ValueError("%d rows do not fit in an Excel sheet (%d at most)" % (len(df), EXCEL_ROWS))
+        write_workbook(path, [('Sheet1', df, {}, None)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate clock-in and ticket exports for testing the payroll.")
+    parser.add_argument('clockIn_File')
+    parser.add_argument('payRoll_File')
+    parser.add_argument('--employees', type=int, default=100)
+    parser.add_argument('--rows', type=int, help="About this many punches (instead of --employees)")
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--tickets-per-day', type=float, default=3)
+    parser.add_argument('--duplicate-rate', type=float, default=0.02)
+    parser.add_argument('--missing-rate', type=float, default=0.03)
+    parser.add_argument('--start', default='2023-06-05', help="First day of the export")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    employees = args.employees
+    if args.rows:
+        employees = employees_for(args.rows, args.days, args.tickets_per_day, args.start)
+
+    clock_in_df, tickets_df = generate(employees, args.days, args.tickets_per_day, args.duplicate_rate,
+                                       args.missing_rate, args.start, args.seed)
+    write_exports(clock_in_df, tickets_df, args.clockIn_File, args.payRoll_File)
+    print("%d punches and %d tickets for %d employees" % (len(clock_in_df), len(tickets_df), employees))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Run independent I/O jobs, (function, *args) tuples, and return what every
+# job gives, in order. Parsing a workbook and writing its XML hold the GIL, so
+# with more than one worker the jobs run on a process pool and take about as
+# long as the slowest of them instead of their sum; 1 runs them one after
+# another in this process. The functions and arguments of a pooled job must
+# pickle (module-level functions, frames, paths).
+def run_jobs(jobs, workers=1):
+    if workers == 1 or len(jobs) < 2:
+        return [function(*args) for function, *args in jobs]
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        futures = [executor.submit(function, *args) for function, *args in jobs]
+        return [future.result() for future in futures]
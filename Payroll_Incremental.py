@@ -0,0 +1,168 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from Payroll_Allocation import week_of, WEEK_START
+from Payroll_Encoding import encode
+from Payroll_Ingest import ingest
+from Payroll_Instrument import start_report, timed, write_report
+from Payroll_Join import duplicate_report
+from Payroll_Pipeline import merge, allocate, validate, render, print_duplicates, payroll_sheet
+from Payroll_Rules import rules_key
+from Payroll_Store import stored_run, store_exports, store_allocations
+
+# Run state kept next to the workbooks
+STATE_FILE = 'payroll_state.pkl'
+
+# Bump when the payroll rules change, so old states are not reused
+STATE_VERSION = 1
+
+# Rank of a punch within its employee-week; it places the cached rows back in
+# the order of the clock-in export
+SOURCE_COLUMN = 'Source Row'
+
+# Frames kept in the run state
+STATE_FRAMES = ['merged_df', 'payroll_df', 'errors_df', 'merged_weekly_df', 'weekly_errors_df']
+
+
+# Employee-week of every row: the employee name ('' when blank) and the first
+# day of the payroll week ('' when there is no date)
+def employee_weeks(df, week_start=WEEK_START):
+    names = df['Employee Name'].astype(object).where(df['Employee Name'].notna(), '').astype(str)
+    weeks = week_of(df['Ticket Date'], week_start).dt.strftime('%Y-%m-%d').fillna('')
+    return [names.to_numpy(), weeks.to_numpy()]
+
+
+# Positions of the rows of every employee-week, in file order
+def employee_week_rows(df, week_start=WEEK_START):
+    return pd.Series(np.arange(len(df))).groupby(employee_weeks(df, week_start)).indices
+
+
+# Fingerprint of every employee-week over its punches and tickets
+def fingerprints(df1, df2, week_start=WEEK_START):
+    hashes = [pd.util.hash_pandas_object(df, index=False).to_numpy() for df in (df1, df2)]
+    rows = [employee_week_rows(df, week_start) for df in (df1, df2)]
+    empty = np.array([], dtype=np.intp)
+
+    result = {}
+    for key in rows[0]:
+        digest = hashlib.sha1()
+        for row_hashes, key_rows in zip(hashes, rows):
+            digest.update(row_hashes[key_rows.get(key, empty)].tobytes())
+            digest.update(b'|')
+        result[key] = digest.hexdigest()
+    return result
+
+
+# Settings a run state is only valid for
+def state_settings(df1, df2, rounding, week_start, rules=None):
+    return (STATE_VERSION, rounding, week_start, rules_key(rules), tuple(df1.columns), tuple(df2.columns))
+
+
+# Load a run state; None when there is none or it cannot be read
+def load_state(state_file):
+    if not os.path.exists(state_file):
+        return None
+    try:
+        return pd.read_pickle(state_file)
+    except Exception as e:
+        print("Ignoring the run state %s: %s" % (state_file, e))
+        return None
+
+
+# Rows of a cached frame that belong to the given employee-weeks
+def rows_of(df, keys, week_start=WEEK_START):
+    if not keys:
+        return np.zeros(len(df), dtype=bool)
+    return pd.MultiIndex.from_arrays(employee_weeks(df, week_start)).isin(list(keys))
+
+
+# Put the computed and the cached rows in the order of the clock-in export
+def splice(frames, df1, week_start=WEEK_START):
+    names, weeks = employee_weeks(df1, week_start)
+    ranks = pd.Series(np.arange(len(df1))).groupby([names, weeks]).cumcount().to_numpy()
+    position = pd.Series(np.arange(len(df1)), index=pd.MultiIndex.from_arrays([names, weeks, ranks]))
+
+    # Empty parts are left out so they do not change the column dtypes
+    frames = [frame for frame in frames if len(frame)] or frames[:1]
+    df = pd.concat(frames, ignore_index=True)
+    if df.empty:
+        return df
+    df_names, df_weeks = employee_weeks(df, week_start)
+    order = position.reindex(pd.MultiIndex.from_arrays([df_names, df_weeks, df[SOURCE_COLUMN].to_numpy()]))
+    return df.iloc[np.argsort(order.to_numpy(), kind='stable')].reset_index(drop=True)
+
+
+# Run the payroll, recomputing only the employee-weeks whose punches or
+# tickets changed since the last run; the other rows come from the run state.
+# The workbooks are always written in full, and a store gets the whole run.
+def run_payroll_incremental(clockIn_File, payRoll_File, output_directory, rounding=False,
+                            week_start=WEEK_START, workers=1, cache_directory=None, state_file=None,
+                            run_report=False, profile_stage=None, rules=None, io_workers=1, store_file=None):
+    report = None
+    if run_report or profile_stage:
+        report = start_report('incremental', [clockIn_File, payRoll_File],
+                              {'rounding': rounding, 'week_start': week_start, 'workers': workers,
+                               'cache_directory': cache_directory, 'rules': rules, 'io_workers': io_workers,
+                               'store_file': store_file},
+                              profile_stage)
+
+    state_file = state_file or os.path.join(output_directory, STATE_FILE)
+    with stored_run(store_file, 'incremental', clockIn_File, payRoll_File, rounding, week_start, rules) as run_id:
+        df1, df2 = timed(report, 'ingest', ingest, clockIn_File, payRoll_File, None, cache_directory, io_workers)
+        if store_file:
+            timed(report, 'store', store_exports, store_file, run_id, df1, df2)
+
+        settings = state_settings(df1, df2, rounding, week_start, rules)
+        current = fingerprints(df1, df2, week_start)
+        state = load_state(state_file)
+        if state is None or state['settings'] != settings:
+            state = {'settings': settings, 'fingerprints': {}, 'frames': {}}
+
+        changed = {key for key, fingerprint in current.items() if state['fingerprints'].get(key) != fingerprint}
+        unchanged = set(current) - changed
+        print("Recomputing %d of %d employee-weeks" % (len(changed), len(current)))
+
+        # Merge, allocate and validate the changed employee-weeks only
+        df1 = df1.copy()
+        df1[SOURCE_COLUMN] = df1.groupby(employee_weeks(df1, week_start)).cumcount()
+        changed_df1 = df1[rows_of(df1, changed, week_start)].copy()
+        changed_df2 = df2[rows_of(df2, changed, week_start)].copy()
+
+        merged_df, _ = timed(report, 'merge', merge, changed_df1, changed_df2, rounding, rules)
+        merged_df, payroll_df, merged_weekly_df = timed(report, 'allocate', allocate, merged_df, week_start, workers,
+                                                        rules)
+        errors_df, weekly_errors_df = timed(report, 'validate', validate, merged_df, merged_weekly_df, rules)
+        computed = dict(zip(STATE_FRAMES, [merged_df, payroll_df, errors_df, merged_weekly_df, weekly_errors_df]))
+
+        # Splice the cached rows of the unchanged employee-weeks back in
+        frames = {}
+        for name in STATE_FRAMES:
+            cached = state['frames'].get(name)
+            parts = [computed[name]]
+            if cached is not None:
+                parts.append(cached[rows_of(cached, unchanged, week_start)])
+            frames[name] = splice(parts, df1, week_start)
+
+        # Cached and computed rows may have been encoded with other categories
+        encode(*frames.values())
+
+        pd.to_pickle({'settings': settings, 'fingerprints': current, 'frames': frames}, state_file)
+
+        # The duplicate report covers the whole exports
+        duplicates_df = duplicate_report(df1, df2)
+        print_duplicates(duplicates_df)
+
+        frames = {name: frames[name].drop(columns=SOURCE_COLUMN) for name in STATE_FRAMES}
+        if store_file:
+            timed(report, 'store', store_allocations, store_file, run_id, payroll_sheet(frames['payroll_df']),
+                  payroll_sheet(frames['merged_weekly_df']))
+        timed(report, 'render', render, output_directory, *[frames[name] for name in STATE_FRAMES], week_start, workers,
+              duplicates_df, rules, io_workers)
+
+    if report is not None:
+        report['recomputed'] = len(changed)
+        report['employee_weeks'] = len(current)
+        write_report(report, output_directory)
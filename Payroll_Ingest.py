@@ -0,0 +1,79 @@
+import importlib.util
+import time
+
+import pandas as pd
+
+from Payroll_Cache import cached_frame
+from Payroll_Encoding import encode
+from Payroll_IO import run_jobs
+
+# Schema of the clock-in export: the punch columns are parsed to datetime64
+# and the merge keys are read as text
+CLOCK_IN_DATES = ['Ticket Date', 'Clock In', 'Clock Out']
+CLOCK_IN_DTYPES = {'Employee Name': object, 'JobNo|Customer|Description': object, 'Hours Worked': float}
+
+# Schema of the ticket export: only these columns are kept
+TICKET_COLUMNS = ['Employee Name', 'Employee ID', 'Ticket Date', 'Agency', 'Clock-In ID', 'Supervisors Name',
+                  'PM Assigned', 'JobNo|Customer|Description', 'WTL Approved', 'WTL Start Date', 'WTL End Date',
+                  'ApprovedOvertime', 'ApprovedOvertime Start Date', 'ApprovedOvertime End Date']
+TICKET_DATES = ['Ticket Date', 'WTL Start Date', 'WTL End Date', 'ApprovedOvertime Start Date',
+                'ApprovedOvertime End Date']
+TICKET_DTYPES = {'Employee Name': object, 'JobNo|Customer|Description': object, 'Agency': object,
+                 'Employee ID': float, 'Clock-In ID': float, 'Supervisors Name': object, 'PM Assigned': object,
+                 'WTL Approved': object, 'ApprovedOvertime': object}
+
+
+# The calamine engine (pip install python-calamine) reads workbooks several
+# times faster than openpyxl; openpyxl is used when it is not installed
+def excel_engine():
+    if importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    return 'openpyxl'
+
+
+# Read one export: only the 'columns' wanted (all when None), with the
+# declared dtypes and the date columns parsed to datetime64
+def read_export(path, columns=None, dtypes=None, dates=(), engine=None):
+    usecols = None if columns is None else (lambda column: column in columns)
+    df = pd.read_excel(path, engine=engine or excel_engine(), usecols=usecols, dtype=dtypes)
+
+    # A missing column raises a KeyError, as selecting it did
+    if columns is not None:
+        df = df[columns]
+
+    for column in dates:
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column])
+
+    # Repeated text columns become categoricals
+    encode(df)
+    return df
+
+
+# Read one export through the cache. Returns the frame and whether it came
+# from the cache.
+def read_cached(cache_directory, kind, path, columns, dtypes, dates, engine=None):
+    settings = (dtypes, dates) if columns is None else (columns, dtypes, dates)
+    return cached_frame(cache_directory, kind, [path], settings,
+                        lambda: read_export(path, columns, dtypes, dates, engine=engine))
+
+
+# Read the clock-in and ticket exports. With a cache directory the parsed
+# frames are kept there, keyed by the file contents and the schema.
+# With 'io_workers' above 1 the two exports are parsed at the same time.
+def ingest(clockIn_File, payRoll_File, engine=None, cache_directory=None, io_workers=1):
+    start = time.perf_counter()
+
+    (df1, cached1), (df2, cached2) = run_jobs([
+        (read_cached, cache_directory, 'clock-in', clockIn_File, None, CLOCK_IN_DTYPES, CLOCK_IN_DATES, engine),
+        (read_cached, cache_directory, 'tickets', payRoll_File, TICKET_COLUMNS, TICKET_DTYPES, TICKET_DATES, engine),
+    ], io_workers)
+
+    # Columns found in both exports share their categories
+    encode(df1, df2)
+
+    print("Ingestion took %.2f seconds (%d clock-in rows, %d ticket rows, %s)" % (
+        time.perf_counter() - start, len(df1), len(df2),
+        'from the cache' if cached1 and cached2 else (engine or excel_engine()) + ' engine'))
+
+    return df1, df2
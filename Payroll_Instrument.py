@@ -0,0 +1,104 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+from datetime import datetime
+
+import pandas as pd
+
+# Run report written next to the outputs
+RUN_REPORT_FILE = 'run_report.json'
+
+# Stages a run can record, and profile
+STAGES = ['ingest', 'merge', 'allocate', 'validate', 'render', 'store']
+
+# Functions listed in the text summary of a profile
+PROFILE_LINES = 30
+
+
+# Start the report of a run. 'profile_stage' runs one stage under cProfile.
+def start_report(run, inputs, settings, profile_stage=None):
+    return {
+        'run': run,
+        'inputs': [os.path.abspath(path) for path in inputs],
+        'settings': settings,
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'profile_stage': profile_stage,
+        'stages': [],
+        'start': time.perf_counter(),
+    }
+
+
+# Peak resident memory of the process so far in MB, or None when it cannot
+# be read (Windows without psutil)
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return round(psutil.Process().memory_info().peak_wset / 1e6, 1)
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / 1e6 if sys.platform == 'darwin' else peak / 1e3, 1)
+
+
+# Row counts of the frames in a value, a tuple of values or a list of arguments
+def row_counts(value):
+    if isinstance(value, pd.DataFrame):
+        return [len(value)]
+    if isinstance(value, (tuple, list)):
+        return [rows for item in value for rows in row_counts(item)]
+    return []
+
+
+# Run a stage of the pipeline. Without a report this only calls the function;
+# with one, the wall and CPU time, the rows in and out and the peak RSS of the
+# stage are recorded, and the profiled stage runs under cProfile (a stage run
+# more than once adds up in the same profile).
+def timed(report, stage, function, *args):
+    if report is None:
+        return function(*args)
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    if stage == report['profile_stage']:
+        profiler = report.setdefault('profile', cProfile.Profile())
+        value = profiler.runcall(function, *args)
+    else:
+        value = function(*args)
+
+    report['stages'].append({
+        'stage': stage,
+        'seconds': round(time.perf_counter() - wall, 4),
+        'cpu_seconds': round(time.process_time() - cpu, 4),
+        'rows_in': row_counts(args),
+        'rows_out': row_counts(value),
+        'peak_rss_mb': peak_rss_mb(),
+    })
+    return value
+
+
+# Write the report of a run to 'output_directory'. A profile is saved next to
+# it, as a .prof file for pstats or snakeviz and as a text summary.
+def write_report(report, output_directory):
+    result = {key: value for key, value in report.items() if key not in ('start', 'profile')}
+    result['seconds'] = round(time.perf_counter() - report['start'], 4)
+    result['peak_rss_mb'] = peak_rss_mb()
+
+    if 'profile' in report:
+        name = 'profile_%s' % report['profile_stage']
+        report['profile'].dump_stats(os.path.join(output_directory, name + '.prof'))
+        summary = io.StringIO()
+        pstats.Stats(report['profile'], stream=summary).sort_stats('cumulative').print_stats(PROFILE_LINES)
+        with open(os.path.join(output_directory, name + '.txt'), 'w') as f:
+            f.write(summary.getvalue())
+        result['profile'] = name + '.prof'
+
+    with open(os.path.join(output_directory, RUN_REPORT_FILE), 'w') as f:
+        json.dump(result, f, indent=2, default=str)
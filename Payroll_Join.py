@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+# Keys of a ticket
+TICKET_KEYS = ['Employee Name', 'Ticket Date', 'JobNo|Customer|Description']
+
+# Columns of the duplicate report: where a row comes from, its row number in
+# the export (the header is row 1), whether it was used and the row that was
+DUPLICATE_COLUMNS = ['Source'] + TICKET_KEYS + ['Excel Row', 'Kept', 'Kept Row']
+
+
+# Find the rows of an export that share a ticket key, hashing the key columns
+# once. The first row of a key wins, like drop_duplicates(keep='first').
+# Returns the mask of the winning rows and the report of the conflicting ones.
+# The rows are numbered by their index, which ingest counts from 0.
+def first_rows(df, source):
+    codes = df.groupby(TICKET_KEYS, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    positions = np.arange(len(df))
+    rows = df.index.to_numpy()
+
+    _, first_position = np.unique(codes, return_index=True)
+    counts = np.bincount(codes, minlength=len(first_position))
+    winner = first_position[codes]
+    kept = positions == winner
+    conflicting = counts[codes] > 1
+
+    report = df.loc[conflicting, TICKET_KEYS].copy()
+    report.insert(0, 'Source', source)
+    report['Excel Row'] = rows[conflicting] + 2
+    report['Kept'] = np.where(kept[conflicting], 'Yes', 'No')
+    report['Kept Row'] = rows[winner[conflicting]] + 2
+    return kept, report
+
+
+# Report of the punches and tickets that share a ticket key
+def duplicate_report(df1, df2):
+    reports = [first_rows(df1, 'Clock In')[1], first_rows(df2, 'Ticket')[1]]
+    return pd.concat(reports, ignore_index=True).reindex(columns=DUPLICATE_COLUMNS)
+
+
+# Join the tickets into the punches through an index of the tickets by key.
+# Every key keeps its first punch and its first ticket, as merging and then
+# dropping the duplicates did; the rows keep the index of the clock-in export.
+# Returns the joined frame and the duplicate report.
+def join_tickets(df1, df2):
+    punches_kept, punch_report = first_rows(df1, 'Clock In')
+    tickets_kept, ticket_report = first_rows(df2, 'Ticket')
+
+    tickets = df2[tickets_kept].set_index(TICKET_KEYS)
+    merged_df = df1[punches_kept].join(tickets, on=TICKET_KEYS)
+
+    report = pd.concat([punch_report, ticket_report], ignore_index=True).reindex(columns=DUPLICATE_COLUMNS)
+    return merged_df, report
@@ -0,0 +1,449 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from Payroll_Allocation import allocate_daily_overtime, allocate_weekly_time, week_of, WEEK_START
+from Payroll_Cache import cached_frames
+from Payroll_Encoding import encode_column, fill_blanks, decode, sorted_categories
+from Payroll_Ingest import ingest
+from Payroll_Instrument import start_report, timed, write_report
+from Payroll_IO import run_jobs
+from Payroll_Join import join_tickets
+from Payroll_Render import (write_workbook, errors_styles, PAYROLL_STYLES, PAYROLL_WIDTHS, ERRORS_WIDTHS,
+                            RESUME_WIDTHS, RESULTS_WIDTHS, DUPLICATES_WIDTHS)
+from Payroll_Reports import build_weekly_resume, build_errors, build_results, RESUME_COLUMNS
+from Payroll_Rounding import round_punches, ROUNDING_INCREMENT, ROUNDING_THRESHOLD
+from Payroll_Rules import compile_rules, rules_key, rule_scopes, uniform
+from Payroll_Store import stored_run, store_exports, store_allocations
+
+# Column order of the Payroll sheets
+PAYROLL_COLUMNS = ['Ticket Date', 'Employee Name', 'Clock In', 'Clock Out', 'Hours Worked',
+                   'Lunch Adjusted', 'Regular Time', 'Overtime', 'Day of the Week', 'Employee ID', 'Agency',
+                   'Clock-In ID', 'Supervisors Name', 'PM Assigned', 'JobNo|Customer|Description', 'Email',
+                   'WTL Approved', 'WTL Start Date', 'WTL End Date', 'ApprovedOvertime', 'ApprovedOvertime Start Date',
+                   'ApprovedOvertime End Date']
+
+# Names of the output workbooks
+PAYROLL_FILE = 'Payroll.xlsx'
+PAYROLL_WEEKLY_FILE = 'PayrollWeekly.xlsx'
+PAYROLL_RESUME_FILE = 'PayrollWeekly_Resume.xlsx'
+RESULTS_FILE = 'Results.xlsx'
+DUPLICATES_FILE = 'Duplicates.xlsx'
+
+# Column of a shallow copy of a frame holding an hour budget that differs
+# between its rows (never written out)
+BUDGET_COLUMN = 'Hour Budget'
+
+# Frames an employee shard computes, in the order allocate_shard returns them
+SHARD_FRAMES = ['merged_df', 'payroll_df', 'errors_df', 'merged_weekly_df', 'weekly_errors_df', 'resume', 'results']
+
+
+################################################
+# MERGE
+
+# Calculate the hours of every punch and merge the tickets into them.
+# Returns the merged tickets and the report of the duplicate punches and tickets.
+def merge(df1, df2, rounding=False, rules=None):
+    # Round the punches to the nearest increment (7 minute rule by default)
+    if rounding:
+        df1['Clock In'] = round_punches(df1['Clock In'], ROUNDING_INCREMENT, ROUNDING_THRESHOLD)
+        df1['Clock Out'] = round_punches(df1['Clock Out'], ROUNDING_INCREMENT, ROUNDING_THRESHOLD)
+
+    # Calculate 'Lunch Adjusted' as the difference between 'Clock Out' and 'Clock In', converted to hours
+    df1['Lunch Adjusted'] = (
+        df1['Clock Out'] - df1['Clock In']).dt.total_seconds() / 3600
+
+    # Add 'Day of the Week' column
+    df1['Day of the Week'] = encode_column(df1['Ticket Date'].dt.day_name())
+
+    # Join the tickets on 'Employee name', 'Ticket Date' and 'JobNo|Customer|Description',
+    # keeping the first punch and the first ticket of every key
+    merged_df, duplicates_df = join_tickets(df1, df2)
+
+    # If 'Agency' is blank, fill with 'CSI'
+    merged_df['Agency'] = fill_blanks(merged_df['Agency'], 'CSI')
+
+    # Taking off the lunch break once Hours Worked reaches the rules of the
+    # agency or client (half an hour at 5 hours by default)
+    rules = compile_rules(merged_df, rules)
+    lunch = merged_df['Hours Worked'] >= rules['lunch_after']
+    merged_df['Lunch Adjusted'] -= np.where(lunch, rules['lunch_hours'], 0)
+
+    return merged_df, duplicates_df
+
+
+# One line per export instead of the duplicate rows themselves
+def print_duplicates(duplicates_df):
+    dropped = duplicates_df[duplicates_df['Kept'] == 'No']['Source'].value_counts()
+    print("Number of duplicate records: %d punches, %d tickets (see %s)" % (
+        dropped.get('Clock In', 0), dropped.get('Ticket', 0), DUPLICATES_FILE))
+
+
+################################################
+# WEEKS
+
+# Run 'function' on the rows of every payroll week (rows without a date are
+# left out). With more than one worker the weeks are spread over a process
+# pool. Returns the results in week order.
+def map_weeks(function, df, week_start=WEEK_START, workers=1):
+    parts = [part for week, part in df.groupby(week_of(df['Ticket Date'], week_start))]
+    if workers == 1 or len(parts) < 2:
+        return [function(part) for part in parts]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, parts))
+
+
+# The hour budget of the rows as the allocation and resume functions take
+# it: the number all the rows share, or the name of a budget column added to
+# a shallow copy of the frame. Returns the frame and the budget.
+def with_budget(df, budgets):
+    budget = uniform(budgets)
+    if budget is not None:
+        return df, budget
+    df = df.copy(deep=False)
+    df[BUDGET_COLUMN] = budgets
+    return df, BUDGET_COLUMN
+
+
+# Weekly 40 hour split of every employee and payroll week
+def allocate_weeks(df, week_start=WEEK_START, workers=1, budget=40):
+    if workers == 1:
+        return allocate_weekly_time(df, budget=budget, week_start=week_start)
+
+    # Rows outside every week keep their Regular Time and get no overtime
+    weekly = pd.DataFrame({'Regular Time': df['Regular Time'].to_numpy(dtype=float),
+                           'Overtime': 0.0}, index=df.index)
+    for part in map_weeks(partial(allocate_weekly_time, budget=budget, week_start=week_start), df, week_start,
+                          workers):
+        weekly.loc[part.index] = part
+    return weekly
+
+
+# PayrollWeekly_Resume rows of every payroll week
+def resume_weeks(df, week_start=WEEK_START, workers=1, budget=40):
+    if workers == 1:
+        return build_weekly_resume(df, budget=budget, week_start=week_start)
+
+    resumes = map_weeks(partial(build_weekly_resume, budget=budget, week_start=week_start), df, week_start, workers)
+    if not resumes:
+        return pd.DataFrame(columns=RESUME_COLUMNS)
+    return pd.concat(resumes, ignore_index=True)
+
+
+################################################
+# ALLOCATE
+
+# Split the hours into Regular Time and Overtime, by the rules of the agency
+# or client of every ticket (see Payroll_Rules).
+# Returns the daily split, the final payroll (daily split with the weekly
+# balance and weekend rules) and the weekly 40 hour split.
+def allocate(merged_df, week_start=WEEK_START, workers=1, rules=None):
+    rules = compile_rules(merged_df, rules)
+    daily = rules['daily_regular']
+
+    # Calculate Regular Time
+    merged_df['Regular Time'] = merged_df['Lunch Adjusted'].where(
+        merged_df['Lunch Adjusted'] <= daily, other=daily)
+
+    # Add the WTL hours (0.5 by default) to 'Lunch Adjusted' if there is a WTL Start Date and WTL End Date
+    wtl = ~merged_df['WTL Start Date'].isnull() & ~merged_df['WTL End Date'].isnull()
+    merged_df['Lunch Adjusted'] += np.where(wtl, rules['wtl_hours'], 0)
+
+    # Calculate the overtime for each ticket, considering that the same employee
+    # can have more than one ticket in a day
+    daily_df, daily_budget = with_budget(merged_df, daily)
+    merged_df['Overtime'] = allocate_daily_overtime(daily_df, budget=daily_budget)
+
+    # Shallow copy: the weekly frame only replaces whole columns, so the
+    # hour columns of merged_df never need to be duplicated
+    merged_weekly_df = merged_df.copy(deep=False)
+
+    # Calculate Regular Time and Overtime against the 40 hour budget of every
+    # employee and payroll week
+    weekly_df, weekly_budget = with_budget(merged_weekly_df, rules['weekly_regular'])
+    weekly_time = allocate_weeks(weekly_df, week_start, workers, weekly_budget)
+    merged_weekly_df['Regular Time'] = weekly_time['Regular Time']
+    merged_weekly_df['Overtime'] = weekly_time['Overtime']
+
+    payroll_df = merged_df.copy(deep=False)
+
+    # Group the data by 'Employee Name', 'Ticket Date', and 'Day of the Week'
+    grouped_df = payroll_df.groupby(
+        ['Employee Name', 'Ticket Date', 'Day of the Week'], observed=True)
+
+    # Calculate the sum of 'Lunch Adjusted' for each group
+    total_lunch_adjusted = grouped_df['Lunch Adjusted'].transform('sum')
+
+    # Calculate the cumulative sum of 'Lunch Adjusted' within each group
+    payroll_df['Cumulative Lunch Adjusted'] = grouped_df['Lunch Adjusted'].cumsum()
+
+    # Calculate the remaining balance after deducting the weekly hours (40) from 'Cumulative Lunch Adjusted'
+    payroll_df['Remaining Balance'] = payroll_df['Cumulative Lunch Adjusted'] - rules['weekly_regular']
+
+    # Calculate the overtime by subtracting 8 from 'Remaining Balance'
+    payroll_df['Overtime'] = np.where(
+        (payroll_df['Remaining Balance'] > 0) & (
+            payroll_df.duplicated(['Employee Name', 'Ticket Date'])),
+        payroll_df['Remaining Balance'],
+        payroll_df['Overtime']
+    )
+
+    payroll_df['Regular Time'] = np.where(
+        (total_lunch_adjusted > daily) & (
+            payroll_df.duplicated(['Employee Name', 'Ticket Date'])),
+        0,
+        payroll_df['Regular Time']
+    )
+
+    # Set 'Overtime' equal to 'Lunch Adjusted' and 'Regular Time' to 0 for the weekend days (Saturday and Sunday)
+    weekend = rules['weekend_days']
+    payroll_df['Overtime'] = payroll_df['Overtime'].where(~weekend, payroll_df['Lunch Adjusted'])
+    payroll_df['Regular Time'] = payroll_df['Regular Time'].where(~weekend, 0)
+
+    # The hours of a day past the double time hours move from 'Overtime' to
+    # 'Double Time', from the daily running total already at hand
+    double_after = rules['double_time_after']
+    if double_after.notna().any():
+        past = (payroll_df['Cumulative Lunch Adjusted'] - double_after).clip(lower=0)
+        double_time = np.minimum(past, payroll_df['Overtime'].clip(lower=0)).fillna(0)
+        payroll_df['Double Time'] = double_time
+        payroll_df['Overtime'] = payroll_df['Overtime'] - double_time
+
+    return merged_df, payroll_df, merged_weekly_df
+
+
+################################################
+# VALIDATE
+
+# Build the Errors sheets of the daily and the weekly payroll
+def validate(merged_df, merged_weekly_df, rules=None):
+    # Apply additional checks for errors: the rows and their 'Error Description'
+    # come from the same rule masks. The tickets were made unique by key in
+    # the merge stage, so there are no duplicates left to look for here.
+    return build_errors(merged_df, rules=rules), build_errors(merged_weekly_df, rules=rules)
+
+
+################################################
+# SHARDS
+
+# Shard of every row: a hash of the employee name that does not change
+# between processes or runs, so all the rows of an employee share a shard
+def employee_shards(names, shards):
+    return (pd.util.hash_pandas_object(names, index=False).to_numpy() % shards).astype(np.int64)
+
+
+# Employees in the order the resume and results group them
+def employee_order(names):
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        return names.cat.categories
+    return sorted_categories(names)
+
+
+# Position of every row of a sheet in the whole run. The payroll and errors
+# rows keep the order of the clock-in export, the resume goes by week and
+# employee, the results by employee and the duplicates by export and row.
+def sheet_keys(sheet, df, employees):
+    if sheet in ('resume', 'results'):
+        rank = employees.get_indexer(df['Employee Name'].astype(object)).astype(np.int64)
+        if sheet == 'results':
+            return rank
+        days = pd.to_datetime(df['Week']).to_numpy().astype('datetime64[D]').astype(np.int64)
+        return days * len(employees) + rank
+    if sheet == 'duplicates':
+        return (df['Source'] == 'Ticket').to_numpy().astype(np.int64) * 2 ** 40 + df['Excel Row'].to_numpy(np.int64)
+    return df.index.to_numpy().astype(np.int64)
+
+
+# The whole chain after the merge for the employees of one shard: allocate,
+# validate, and the resume and results rows
+def allocate_shard(merged_df, week_start=WEEK_START, rules=None):
+    merged_df, payroll_df, merged_weekly_df = allocate(merged_df, week_start, 1, rules)
+    errors_df, weekly_errors_df = validate(merged_df, merged_weekly_df, rules)
+    resume_df, budget = with_budget(merged_df, compile_rules(merged_df, rules)['weekly_regular'])
+    return (merged_df, payroll_df, errors_df, merged_weekly_df, weekly_errors_df,
+            resume_weeks(resume_df, week_start, 1, budget), build_results(payroll_sheet(payroll_df)))
+
+
+# Put the frames of the shards back together in the order of a serial run
+def combine_shards(parts, employees):
+    frames = []
+    for number, name in enumerate(SHARD_FRAMES):
+        # Empty parts are left out so they do not change the column dtypes
+        shards = [part[number] for part in parts if len(part[number])] or [parts[0][number]]
+        df = pd.concat(shards)
+        frames.append(df.iloc[np.argsort(sheet_keys(name, df, employees), kind='stable')])
+
+    # Shards whose rules give no double time have no column for it
+    payroll_df = frames[SHARD_FRAMES.index('payroll_df')]
+    if 'Double Time' in payroll_df.columns:
+        payroll_df['Double Time'] = payroll_df['Double Time'].fillna(0.0)
+    results = frames[SHARD_FRAMES.index('results')]
+    if 'Double Time Hours' in results.columns:
+        results['Double Time Hours'] = results['Double Time Hours'].fillna(0.0)
+    frames[SHARD_FRAMES.index('resume')] = frames[SHARD_FRAMES.index('resume')].reset_index(drop=True)
+    frames[SHARD_FRAMES.index('results')] = results.reset_index(drop=True)
+    return frames
+
+
+# Run allocate_shard on the employees of every shard, spread over a process
+# pool. The employees never share a group, so the frames come out the same
+# as those of a serial run. Returns them as listed in SHARD_FRAMES.
+def allocate_sharded(merged_df, week_start=WEEK_START, shard_workers=2, rules=None):
+    shard = employee_shards(merged_df['Employee Name'], shard_workers)
+    parts = [merged_df[shard == number] for number in range(shard_workers)]
+    parts = [part for part in parts if len(part)]
+    if len(parts) < 2:
+        return list(allocate_shard(merged_df, week_start, rules))
+
+    with ProcessPoolExecutor(max_workers=len(parts)) as executor:
+        parts = list(executor.map(partial(allocate_shard, week_start=week_start, rules=rules), parts))
+    return combine_shards(parts, employee_order(merged_df['Employee Name']))
+
+
+################################################
+# RENDER
+
+# Prepare a Payroll sheet for display: assignment placeholders, column order
+# and negative overtime shown as 0
+def payroll_sheet(df):
+    df = df.copy(deep=False)
+
+    # Fill empty Supervisor Name and PM Assigned fields with "NEEDS TO BE ASSIGNED"
+    df['Supervisors Name'] = fill_blanks(df['Supervisors Name'], 'NEEDS TO BE ASSIGNED')
+    df['PM Assigned'] = fill_blanks(df['PM Assigned'], 'NEEDS TO BE ASSIGNED')
+
+    df['Overtime'] = df['Overtime'].where(~(df['Overtime'] < 0), 0)
+
+    # Reorder the columns in the DataFrame; double time, when the rules give
+    # any, comes last so the styled columns keep their places
+    return df.reindex(columns=PAYROLL_COLUMNS + [column for column in ['Double Time'] if column in df.columns])
+
+
+# Show 'Ticket Date' in 'mm/dd/yyyy' format
+def display_dates(df):
+    df = df.copy(deep=False)
+    df['Ticket Date'] = df['Ticket Date'].dt.strftime('%m/%d/%Y')
+    return df
+
+
+# Write a Payroll workbook with its Payroll and Errors sheets, styled while
+# the rows are streamed out. The text columns are decoded only here.
+def render_payroll(path, payroll_df, errors_df, rules=None):
+    errors_style = errors_styles(*rule_scopes('daily_regular', rules))
+    write_workbook(path, [('Payroll', decode(display_dates(payroll_df)), PAYROLL_WIDTHS, PAYROLL_STYLES),
+                          ('Errors', decode(display_dates(errors_df)), ERRORS_WIDTHS, errors_style)])
+
+
+# Build the total, job area and week day rows of every employee and week,
+# and write them
+def render_resume(path, resume_df, week_start=WEEK_START, workers=1, budget=40):
+    write_workbook(path, [("PayrollWeekly_Resume", resume_weeks(resume_df, week_start, workers, budget),
+                           RESUME_WIDTHS, None)])
+
+
+# Sum the Regular Time and Overtime of every employee, job area, agency and
+# day, and write them
+def render_results(path, payroll_df):
+    write_workbook(path, [('Sheet1', build_results(payroll_df), RESULTS_WIDTHS, None)])
+
+
+# Write every output workbook in write-only mode. This is the only stage that
+# touches Excel: the Results sheet is built from the payroll frame in memory.
+# The workbooks do not depend on each other, so with 'io_workers' above 1
+# they are written at the same time. The resume and results rows are built
+# here unless they are given (a sharded run builds them by shard).
+def render(output_directory, merged_df, payroll_df, errors_df, merged_weekly_df, weekly_errors_df,
+           week_start=WEEK_START, workers=1, duplicates_df=None, rules=None, io_workers=1, resume=None,
+           results=None):
+    payroll_df = payroll_sheet(payroll_df)
+    resume_path = os.path.join(output_directory, PAYROLL_RESUME_FILE)
+    results_path = os.path.join(output_directory, RESULTS_FILE)
+
+    jobs = [
+        (render_payroll, os.path.join(output_directory, PAYROLL_WEEKLY_FILE), payroll_sheet(merged_weekly_df),
+         weekly_errors_df, rules),
+        (render_payroll, os.path.join(output_directory, PAYROLL_FILE), payroll_df, errors_df, rules),
+    ]
+    if resume is None:
+        resume_df, budget = with_budget(merged_df, compile_rules(merged_df, rules)['weekly_regular'])
+        jobs.insert(1, (render_resume, resume_path, resume_df, week_start, workers, budget))
+    else:
+        jobs.insert(1, (write_workbook, resume_path, [("PayrollWeekly_Resume", resume, RESUME_WIDTHS, None)]))
+    if results is None:
+        jobs.append((render_results, results_path, payroll_df))
+    else:
+        jobs.append((write_workbook, results_path, [('Sheet1', results, RESULTS_WIDTHS, None)]))
+    # The punches and tickets that shared a key, and the rows that were used
+    if duplicates_df is not None:
+        jobs.append((write_workbook, os.path.join(output_directory, DUPLICATES_FILE),
+                     [('Duplicates', duplicates_df, DUPLICATES_WIDTHS, None)]))
+    run_jobs(jobs, io_workers)
+
+
+# Run the whole payroll: ingest, merge, allocate, validate and render.
+# The input may hold several payroll weeks starting on 'week_start'; with
+# more than one worker the weeks are computed in separate processes.
+# With a cache directory the parsed and merged frames are reused when the
+# same exports are run again, so a warm rerun does not parse Excel at all.
+# With 'run_report' the time, rows and memory of every stage are written to
+# run_report.json in the output directory; 'profile_stage' also profiles one stage.
+# 'rules' are the overtime rules of Payroll_Rules (the defaults when None).
+# 'io_workers' processes read the two exports and write the workbooks.
+# With a 'store_file' the punches, tickets and allocations of the run are
+# added to that timesheet store (Payroll_Store.py); the exports are then read
+# on every run, through the cache, and a run that fails is discarded.
+# With 'shard_workers' above 1 the employees are split into that many shards,
+# allocated, validated and summed up in separate processes (see
+# allocate_sharded); the workbooks are the same as those of a serial run.
+def run_payroll(clockIn_File, payRoll_File, output_directory, rounding=False, week_start=WEEK_START, workers=1,
+                cache_directory=None, run_report=False, profile_stage=None, rules=None, io_workers=1,
+                store_file=None, shard_workers=1):
+    report = None
+    if run_report or profile_stage:
+        report = start_report('full', [clockIn_File, payRoll_File],
+                              {'rounding': rounding, 'week_start': week_start, 'workers': workers,
+                               'cache_directory': cache_directory, 'rules': rules, 'io_workers': io_workers,
+                               'store_file': store_file, 'shard_workers': shard_workers},
+                              profile_stage)
+
+    # The store keeps the exports as they were read, before the merge: with a
+    # store they are loaded on every run, from the cache when there is one
+    with stored_run(store_file, 'full', clockIn_File, payRoll_File, rounding, week_start, rules) as run_id:
+        exports = None
+        if store_file:
+            exports = timed(report, 'ingest', ingest, clockIn_File, payRoll_File, None, cache_directory, io_workers)
+            timed(report, 'store', store_exports, store_file, run_id, *exports)
+
+        (merged_df, duplicates_df), cached = cached_frames(
+            cache_directory, 'merged', [clockIn_File, payRoll_File],
+            (rounding, ROUNDING_INCREMENT, ROUNDING_THRESHOLD, rules_key(rules)),
+            lambda: timed(report, 'merge', merge,
+                          *(exports or timed(report, 'ingest', ingest, clockIn_File, payRoll_File, None,
+                                             cache_directory, io_workers)),
+                          rounding, rules),
+            2)
+        if cached:
+            print("Merged tickets loaded from the cache")
+        print_duplicates(duplicates_df)
+        if shard_workers > 1:
+            # The 'allocate' stage also validates and builds the resume and results
+            merged_df, payroll_df, errors_df, merged_weekly_df, weekly_errors_df, resume, results = timed(
+                report, 'allocate', allocate_sharded, merged_df, week_start, shard_workers, rules)
+        else:
+            merged_df, payroll_df, merged_weekly_df = timed(report, 'allocate', allocate, merged_df, week_start,
+                                                            workers, rules)
+            errors_df, weekly_errors_df = timed(report, 'validate', validate, merged_df, merged_weekly_df, rules)
+            resume = results = None
+        if store_file:
+            timed(report, 'store', store_allocations, store_file, run_id, payroll_sheet(payroll_df),
+                  payroll_sheet(merged_weekly_df))
+        timed(report, 'render', render, output_directory, merged_df, payroll_df, errors_df, merged_weekly_df,
+              weekly_errors_df, week_start, workers, duplicates_df, rules, io_workers, resume, results)
+
+    if report is not None:
+        report['cached'] = cached
+        write_report(report, output_directory)
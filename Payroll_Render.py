@@ -0,0 +1,243 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+
+# Column widths of every sheet
+PAYROLL_WIDTHS = {'A': 11.26, 'B': 26.14, 'C': 20, 'D': 19, 'E': 18, 'F': 19, 'G': 19, 'H': 16, 'I': 16, 'J': 26,
+                  'K': 19, 'L': 20, 'M': 19, 'N': 29, 'O': 71.57, 'P': 30, 'Q': 22, 'R': 18, 'S': 20.43, 'T': 20.43,
+                  'U': 29, 'V': 29, 'W': 29}
+ERRORS_WIDTHS = {'A': 11.26, 'B': 26.14, 'C': 31.86, 'D': 19, 'E': 20.43, 'F': 18.71, 'G': 20.86, 'H': 18,
+                 'I': 32.57, 'J': 28.71, 'K': 20, 'L': 22.86, 'M': 33.86, 'N': 71.57, 'O': 31.86, 'P': 20.43,
+                 'Q': 20.43, 'R': 20.43, 'S': 20.43, 'T': 29, 'U': 29, 'V': 29, 'W': 29}
+RESUME_WIDTHS = {'A': 60, 'B': 23, 'C': 23, 'D': 33, 'E': 14}
+DUPLICATES_WIDTHS = {'A': 12, 'B': 26.14, 'C': 14, 'D': 71.57, 'E': 12, 'F': 8, 'G': 12}
+RESULTS_WIDTHS = {'A': 29.71, 'B': 12.57, 'C': 72.71, 'D': 17, 'E': 14.29, 'F': 15.14, 'G': 15, 'H': 16.71,
+                  'I': 20.29, 'J': 27.71, 'K': 22.43, 'L': 23.57, 'M': 35.29, 'N': 20.57, 'O': 20.57}
+
+# Number formats DataFrame.to_excel gives to dates
+DATETIME_FORMAT = 'YYYY-MM-DD HH:MM:SS'
+DATE_FORMAT = 'YYYY-MM-DD'
+
+# Create a red bold font
+red_font = Font(color="FF0000", bold=True)
+
+# Header style of DataFrame.to_excel
+thin = Side(style='thin')
+header_font = Font(bold=True)
+header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+header_alignment = Alignment(horizontal='center', vertical='top')
+
+# Rows converted at a time while streaming a sheet
+CHUNK_ROWS = 10000
+
+# Positions of the styled columns: D holds Clock Out on the Payroll sheets,
+# H the Overtime and U/V the ApprovedOvertime window (13 and 14 columns after
+# H); G is the column checked on the Errors sheets, where the overrides of the
+# rules match the Agency (K) and the JobNo|Customer|Description (F)
+CLOCK_OUT_COLUMN = 3
+OVERTIME_COLUMN = 7
+APPROVED_START_COLUMN = 20
+APPROVED_END_COLUMN = 21
+ERRORS_CHECK_COLUMN = 6
+ERRORS_MATCH_COLUMNS = {'agency': 10, 'client': 5}
+
+# Text written in the blank Clock Out cells
+MISSING_CLOCK_OUT = 'Clock Out Time?'
+
+# Cells shown in red, as conditional formatting over the whole column: the
+# formula is written for the first row and Excel moves it down the rows, so
+# the work and the file size do not grow with the rows.
+# - missing Clock Out punches
+# - positive Overtime without an ApprovedOvertime window, or Overtime that is
+#   not a number
+# - column G of the Errors sheets under the daily regular hours of the row
+#   (8 by default), or not a number
+CLOCK_OUT_HIGHLIGHT = (CLOCK_OUT_COLUMN, 'D2="%s"' % MISSING_CLOCK_OUT)
+OVERTIME_HIGHLIGHT = (OVERTIME_COLUMN, 'AND(H2<>"",OR(NOT(ISNUMBER(H2)),AND(H2>0,OR(U2="",V2=""))))')
+
+
+# Excel condition of the Errors rows an override of the rules matches: the
+# cells contain its texts, ignoring case, as in Payroll_Rules.matches
+def override_condition(override):
+    conditions = []
+    for key, position in ERRORS_MATCH_COLUMNS.items():
+        if key in override:
+            # SEARCH takes wildcards, escaped with ~
+            text = str(override[key]).replace('~', '~~').replace('*', '~*').replace('?', '~?').replace('"', '""')
+            conditions.append('ISNUMBER(SEARCH("%s",%s2))' % (text, get_column_letter(position + 1)))
+    return 'AND(%s)' % ','.join(conditions)
+
+
+# Highlights of column G of the Errors sheets under the daily regular hours:
+# 'daily' hours, or for the rows of the (override, hours) 'scopes' of the rules
+# the hours of the first scope matching them
+def under_daily_highlights(daily=8, scopes=()):
+    under = 'AND(G2<>"",%sOR(NOT(ISNUMBER(G2)),G2<%g))'
+    if all(hours == daily for override, hours in scopes):
+        return [(ERRORS_CHECK_COLUMN, under % ('', daily))]
+
+    highlights = []
+    earlier = []
+    for override, hours in scopes:
+        condition = override_condition(override)
+        highlights.append((ERRORS_CHECK_COLUMN, under % (''.join('NOT(%s),' % other for other in earlier)
+                                                         + condition + ',', hours)))
+        earlier.append(condition)
+    highlights.append((ERRORS_CHECK_COLUMN, under % ('NOT(OR(%s)),' % ','.join(earlier), daily)))
+    return highlights
+
+
+# Styles of the Errors sheets of a run whose rows have 'daily' regular hours,
+# or other hours in the 'scopes' of Payroll_Rules.rule_scopes
+def errors_styles(daily=8, scopes=()):
+    return {'text': {CLOCK_OUT_COLUMN: MISSING_CLOCK_OUT},
+            'highlights': [CLOCK_OUT_HIGHLIGHT] + under_daily_highlights(daily, scopes)}
+
+
+# Styles of a sheet: the text of the blank cells of some columns, and the
+# highlights of the sheet
+PAYROLL_STYLES = {'text': {CLOCK_OUT_COLUMN: MISSING_CLOCK_OUT},
+                  'highlights': [CLOCK_OUT_HIGHLIGHT, OVERTIME_HIGHLIGHT]}
+ERRORS_STYLES = errors_styles()
+
+
+# Convert one value the way DataFrame.to_excel does.
+# Returns the value and its number format.
+def excel_value(value):
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return None, None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value), None
+    if isinstance(value, (int, np.integer)):
+        return int(value), None
+    if isinstance(value, (float, np.floating)):
+        if np.isinf(value):
+            return 'inf' if value > 0 else '-inf', None
+        return float(value), None
+    if isinstance(value, datetime.datetime):
+        return value, DATETIME_FORMAT
+    if isinstance(value, datetime.date):
+        return value, DATE_FORMAT
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds() / 86400, '0'
+    return str(value), None
+
+
+# Convert a column to Excel values: returns the values and the number format
+# of every value (None when the column has no formats)
+def excel_column(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.astype(object).where(series.notna(), None).tolist()
+        formats = [None if value is None else DATETIME_FORMAT for value in values]
+        return values, formats
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return [excel_value(value)[0] for value in series.astype(object)], None
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy(dtype=float)
+        converted = np.where(np.isnan(values), None, values.astype(object))
+        converted[np.isposinf(values)] = 'inf'
+        converted[np.isneginf(values)] = '-inf'
+        return converted.tolist(), None
+
+    values, formats = [], []
+    for value in series.tolist():
+        value, number_format = excel_value(value)
+        values.append(value)
+        formats.append(number_format)
+    return values, (formats if any(formats) else None)
+
+
+# Blank cells: nothing written or an empty text
+def blank(series):
+    return (series.isna() | series.astype(object).eq('')).to_numpy()
+
+
+# Column of a frame by position, or an all-blank column when it is missing
+def column_at(df, position):
+    if position < df.shape[1]:
+        return df.iloc[:, position]
+    return pd.Series(np.nan, index=df.index)
+
+
+# Add the highlights of a sheet over its 'rows' data rows, below the header
+def add_highlights(ws, highlights, rows):
+    if not rows:
+        return
+    for position, formula in highlights:
+        column = get_column_letter(position + 1)
+        ws.conditional_formatting.add('%s2:%s%d' % (column, column, rows + 1),
+                                      FormulaRule(formula=[formula], font=red_font))
+
+
+# Stream a DataFrame into a write-only sheet. Widths are set first, replaced
+# texts and number formats while every row is written, and the highlights
+# once the rows are known.
+def write_sheet(wb, sheet_name, df, widths, styles=None):
+    write_frames(wb, sheet_name, df.columns, [df], widths, styles)
+
+
+# Stream a sheet that arrives as a sequence of frames with the given columns,
+# so it never has to be held in memory whole
+def write_frames(wb, sheet_name, columns, frames, widths, styles=None):
+    ws = wb.create_sheet(sheet_name)
+    for column, width in widths.items():
+        ws.column_dimensions[column].width = width
+
+    header = []
+    for column in columns:
+        cell = WriteOnlyCell(ws, value=str(column))
+        cell.font = header_font
+        cell.border = header_border
+        cell.alignment = header_alignment
+        header.append(cell)
+    ws.append(header)
+
+    styles = styles or {}
+    rows = 0
+    for df in frames:
+        write_rows(ws, df, styles.get('text', {}))
+        rows += len(df)
+    add_highlights(ws, styles.get('highlights', []), rows)
+
+
+# Append the rows of a frame to a write-only sheet. 'text' replaces the blank
+# cells of some columns, by position.
+def write_rows(ws, df, text=None):
+    for start in range(0, len(df), CHUNK_ROWS):
+        chunk = df.iloc[start:start + CHUNK_ROWS]
+        columns = [excel_column(chunk.iloc[:, position]) for position in range(chunk.shape[1])]
+
+        for position, replacement in (text or {}).items():
+            values = columns[position][0]
+            for row in np.flatnonzero(blank(column_at(chunk, position))):
+                values[row] = replacement
+
+        formatted = [position for position, (values, formats) in enumerate(columns) if formats is not None]
+        for row in range(len(chunk)):
+            values = [column[0][row] for column in columns]
+            for position in formatted:
+                number_format = columns[position][1][row]
+                if number_format:
+                    cell = WriteOnlyCell(ws, value=values[position])
+                    cell.number_format = number_format
+                    values[position] = cell
+            ws.append(values)
+
+
+# Write a workbook in write-only mode: one (sheet name, DataFrame, widths,
+# styles) entry per sheet, saved in a single pass. Instead of a DataFrame a
+# sheet can be given as a (columns, frames) pair, written frame by frame.
+def write_workbook(path, sheets):
+    wb = Workbook(write_only=True)
+    for sheet_name, df, widths, styles in sheets:
+        if isinstance(df, pd.DataFrame):
+            write_sheet(wb, sheet_name, df, widths, styles)
+        else:
+            write_frames(wb, sheet_name, *df, widths, styles)
+    wb.save(path)
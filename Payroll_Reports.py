@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+
+from Payroll_Allocation import spend_budget, week_days, week_of, WEEK_START
+from Payroll_Rules import compile_rules, uniform
+
+RESUME_COLUMNS = ['Row Labels', 'Sum of Regular Time', 'Sum of Overtime', 'Employee Name', 'Week']
+
+RESULTS_COLUMNS = ['Employee Name', 'Employee ID', 'JobNo|Customer|Description', 'Agency', 'Ticket Date', 'Day',
+                   'Regular Hours', 'Overtime Hours', 'Clock In', 'Clock Out', 'Supervisors Name', 'PM Assigned',
+                   'Email', 'WTL Approved', 'ApprovedOvertime']
+
+
+# Rules of the Errors sheet, in priority order: the first rule that matches a
+# row gives its 'Error Description'. Rows over the daily regular hours (8 by
+# default) without an approved overtime window are listed on the sheet with
+# a blank description.
+def error_rules(df, hours_column='Lunch Adjusted', compiled=None):
+    compiled = compile_rules(df) if compiled is None else compiled
+    daily = compiled['daily_regular']
+    no_clock_in = df['Clock In'].isna()
+    no_clock_out = df['Clock Out'].isna()
+    hours = df[hours_column]
+    overtime_not_approved = ((hours > daily) &
+                             df['ApprovedOvertime Start Date'].isnull() &
+                             df['ApprovedOvertime End Date'].isnull())
+
+    # One text for all rows unless the rules give them other daily hours
+    hours_text = uniform(daily)
+    if hours_text is not None or not len(df):
+        under = 'Less Than %g Hours' % (8 if hours_text is None else hours_text)
+    else:
+        under = np.array(['Less Than %g Hours' % value for value in daily], dtype=object)
+
+    return [
+        (no_clock_in & no_clock_out, 'No Clock In or Clock Out Time'),
+        (no_clock_in, 'No Clock In'),
+        (no_clock_out, 'No Clock Out'),
+        (hours < daily, under),
+        (overtime_not_approved, np.nan),
+    ]
+
+
+# Build the Errors sheet: the rows matching any rule, with their description
+def build_errors(df, hours_column='Lunch Adjusted', rules=None):
+    compiled = compile_rules(df, rules)
+    checks = error_rules(df, hours_column, compiled)
+    masks = [mask.to_numpy(dtype=bool) for mask, description in checks]
+    descriptions = [np.array(description, dtype=object) for mask, description in checks]
+
+    is_error = np.logical_or.reduce(masks)
+    errors_df = df[is_error].copy()
+
+    # Negative overtime is shown as 0 unless the rules keep it (CSI agency)
+    keep_negative = compiled['keep_negative_overtime'].to_numpy()[is_error]
+    errors_df.loc[(errors_df['Overtime'] < 0) & ~keep_negative, 'Overtime'] = 0
+
+    errors_df['Error Description'] = np.select(masks, descriptions, default=np.nan)[is_error]
+    return errors_df
+
+
+# Build the PayrollWeekly_Resume rows of a single payroll week for all
+# employees at once. Every employee gets a total row, one row per
+# 'JobNo|Customer|Description' (sorted) and one row per day of the week,
+# each split against the 40 hour budget of the employee. The budget is a
+# number of hours or the column holding it (the first row of an employee
+# sets the budget of the employee).
+def build_week_resume(df, hours_column='Lunch Adjusted', budget=40, week_start=WEEK_START):
+    df = df[df['Employee Name'].notna()]
+    days_of_week = week_days(week_start)
+    hours = df[hours_column].astype(float)
+    names = df['Employee Name']
+
+    # Total row of every employee
+    totals = hours.groupby(names, observed=True).sum()
+    employees = totals.index
+    if isinstance(budget, str):
+        budget = df[budget].astype(float).groupby(names, observed=True).first().reindex(employees)
+
+    # Hours per day, spent in date order
+    days = hours.groupby([names, df['Ticket Date'].dt.normalize()], observed=True).sum()
+    day_names = df['Day of the Week'].groupby(
+        [names, df['Ticket Date'].dt.normalize()], observed=True).first()
+    day_employees = days.index.get_level_values(0)
+    day_regular, day_overtime, _, day_spent = spend_budget(
+        pd.Series(days.to_numpy()), [pd.Series(day_employees)], employee_budget(budget, day_employees))
+
+    # A day only writes the columns its branch of the split touches, and a
+    # later date of the same week day overwrites an earlier one
+    day_frame = pd.DataFrame({'Employee Name': day_employees,
+                              'Row Labels': day_names.to_numpy(),
+                              'Regular': day_regular.to_numpy(),
+                              'Overtime': day_overtime.to_numpy(),
+                              'Writes Regular': ~day_spent.to_numpy(),
+                              'Writes Overtime': day_spent.to_numpy() | (day_overtime.to_numpy() > 0)})
+    week_regular = day_frame[day_frame['Writes Regular']].groupby(
+        ['Employee Name', 'Row Labels'], observed=True)['Regular'].last()
+    week_overtime = day_frame[day_frame['Writes Overtime']].groupby(
+        ['Employee Name', 'Row Labels'], observed=True)['Overtime'].last()
+
+    # Hours per job area, spent in job area order
+    areas = hours.groupby([names, df['JobNo|Customer|Description']], observed=True).sum()
+    area_employees = areas.index.get_level_values(0)
+    area_regular, area_overtime, _, _ = spend_budget(
+        pd.Series(areas.to_numpy()), [pd.Series(area_employees)], employee_budget(budget, area_employees))
+
+    # Preallocate the sheet: one total row, the job area rows and seven
+    # week day rows per employee
+    area_counts = pd.Series(area_employees).value_counts().reindex(employees, fill_value=0).to_numpy()
+    block_sizes = 1 + area_counts + len(days_of_week)
+    starts = np.cumsum(block_sizes) - block_sizes
+    size = int(block_sizes.sum())
+
+    labels = np.empty(size, dtype=object)
+    regular = np.zeros(size)
+    overtime = np.zeros(size)
+    employee_names = np.repeat(employees.to_numpy(dtype=object), block_sizes)
+
+    # Total rows
+    labels[starts] = employees.to_numpy(dtype=object)
+    total_budget = budget.to_numpy() if isinstance(budget, pd.Series) else budget
+    regular[starts] = np.minimum(totals.to_numpy(), total_budget)
+    overtime[starts] = np.maximum(totals.to_numpy() - total_budget, 0)
+
+    # Job area rows follow the total row
+    employee_position = pd.Series(np.arange(len(employees)), index=employees)
+    area_owner = employee_position.reindex(area_employees).to_numpy()
+    area_rank = pd.Series(area_owner).groupby(area_owner).cumcount().to_numpy()
+    area_rows = starts[area_owner] + 1 + area_rank
+    labels[area_rows] = areas.index.get_level_values(1).to_numpy(dtype=object)
+    regular[area_rows] = area_regular.to_numpy()
+    overtime[area_rows] = area_overtime.to_numpy()
+
+    # Week day rows close every block
+    day_rows = (starts + 1 + area_counts)[:, None] + np.arange(len(days_of_week))
+    labels[day_rows] = days_of_week
+    day_index = pd.MultiIndex.from_product([employees, days_of_week])
+    regular[day_rows.ravel()] = week_regular.reindex(day_index, fill_value=0).to_numpy()
+    overtime[day_rows.ravel()] = week_overtime.reindex(day_index, fill_value=0).to_numpy()
+
+    return pd.DataFrame({'Row Labels': labels,
+                         'Sum of Regular Time': regular,
+                         'Sum of Overtime': overtime,
+                         'Employee Name': employee_names}, columns=RESUME_COLUMNS[:-1])
+
+
+# Budget of the rows of some employees: the number, or the budget of each
+# employee looked up in the per-employee budgets
+def employee_budget(budget, employees):
+    if isinstance(budget, pd.Series):
+        return budget.reindex(employees).to_numpy()
+    return budget
+
+
+# Build the PayrollWeekly_Resume sheet: the rows of every payroll week in
+# date order, each block with the first day of its week
+def build_weekly_resume(df, hours_column='Lunch Adjusted', budget=40, week_start=WEEK_START):
+    weeks = week_of(df['Ticket Date'], week_start)
+    resumes = []
+    for week, part in df.groupby(weeks):
+        resume = build_week_resume(part, hours_column, budget, week_start)
+        resume['Week'] = week.date()
+        resumes.append(resume)
+
+    if not resumes:
+        return pd.DataFrame(columns=RESUME_COLUMNS)
+    return pd.concat(resumes, ignore_index=True)
+
+
+# Group the tickets by the key columns and the ticket day in one pass.
+# Returns the named aggregations ('sums', e.g. {'Regular Hours': ('Regular
+# Time', 'sum')}) and the first row of every group, both in group order.
+def aggregate_by_day(df, key_columns, sums):
+    keys = [df[column] for column in key_columns] + [df['Ticket Date'].dt.normalize()]
+    grouped = df.groupby(keys, observed=True)
+    totals = grouped.agg(**sums)
+
+    # The first row of a group, blanks included, like group.iloc[0]
+    codes = grouped.ngroup().to_numpy(dtype=float, na_value=-1)
+    rows = np.flatnonzero(codes >= 0)
+    _, first = np.unique(codes[rows], return_index=True)
+
+    return totals, df.iloc[rows[first]]
+
+
+# Build the Results sheet: the hours of every employee, job area, agency and
+# day summed up, with the details of the first ticket of the day
+def build_results(df):
+    sums = {'Regular Hours': ('Regular Time', 'sum'), 'Overtime Hours': ('Overtime', 'sum')}
+    if 'Double Time' in df.columns:
+        sums['Double Time Hours'] = ('Double Time', 'sum')
+    totals, first = aggregate_by_day(df, ['Employee Name', 'JobNo|Customer|Description', 'Agency'], sums)
+
+    result = pd.DataFrame({column: first[column].to_numpy() for column in RESULTS_COLUMNS
+                           if column in first.columns}, columns=RESULTS_COLUMNS)
+    result['Ticket Date'] = first['Ticket Date'].dt.date.to_numpy()
+    result['Day'] = first['Ticket Date'].dt.day_name().to_numpy()
+    result['Regular Hours'] = totals['Regular Hours'].to_numpy()
+    result['Overtime Hours'] = totals['Overtime Hours'].to_numpy()
+    # Double time, when the rules give any, comes last
+    if 'Double Time Hours' in totals.columns:
+        result['Double Time Hours'] = totals['Double Time Hours'].to_numpy()
+    return result
@@ -0,0 +1,111 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from Payroll_Cache import cached_frame, file_hash
+from Payroll_Render import write_workbook
+
+# Columns read from a roster workbook (like Test3.xlsx); the Employee ID is optional
+ROSTER_COLUMNS = ['Employee Name', 'Employee ID']
+
+# Columns read from the exports or workbooks checked against a roster
+PERIOD_COLUMNS = ['Employee Name', 'Employee ID', 'Ticket Date']
+
+# Workbook and columns of the missing employee report
+MISSING_FILE = 'Missing Employees.xlsx'
+MISSING_COLUMNS = ['Employee Name', 'Ticket Date']
+MISSING_WIDTHS = {'A': 29.71, 'B': 14.29}
+
+# Rosters loaded by this process, by the hash of their file
+ROSTERS = {}
+
+
+# Read the names and IDs of a roster workbook
+def read_roster(path):
+    roster = pd.read_excel(path, usecols=lambda column: column in ROSTER_COLUMNS, dtype={'Employee Name': object})
+    if 'Employee Name' not in roster.columns:
+        raise ValueError("%s has no 'Employee Name' column" % path)
+    if 'Employee ID' not in roster.columns:
+        roster['Employee ID'] = np.nan
+    roster['Employee ID'] = pd.to_numeric(roster['Employee ID'], errors='coerce')
+    return roster[ROSTER_COLUMNS].dropna(how='all').reset_index(drop=True)
+
+
+# Load a roster once per version of its file: from this process, from the
+# cache directory when one is given, or from the workbook
+def load_roster(path, cache_directory=None):
+    key = file_hash(path)
+    if key not in ROSTERS:
+        roster = cached_frame(cache_directory, 'roster', [path], (), lambda: read_roster(path))[0]
+        ROSTERS[key] = roster_index(roster)
+    return ROSTERS[key]
+
+
+# Hashed indexes of the names and IDs of a roster, for set lookups
+def roster_index(roster):
+    return {
+        'names': pd.Index(roster['Employee Name'].dropna().unique()),
+        'ids': pd.Index(roster['Employee ID'].dropna().unique()),
+    }
+
+
+# Rows whose value is in a hashed index; categoricals are looked up on their
+# categories only
+def in_index(column, index):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        known = np.append(column.cat.categories.isin(index), False)
+        # Blanks have the code -1, which picks the False at the end
+        return known[column.cat.codes.to_numpy()]
+    return column.isin(index).to_numpy()
+
+
+# Employees of a period whose name is not on the roster: one row per employee
+# and day, sorted. With 'match_ids' an employee whose Employee ID is on the
+# roster is known as well, whatever the name. The anti-join replaces a scan of
+# the roster for every group of the period.
+def missing_employees(df, index, match_ids=False):
+    known = in_index(df['Employee Name'], index['names'])
+    if match_ids and 'Employee ID' in df.columns:
+        known |= in_index(pd.to_numeric(df['Employee ID'], errors='coerce'), index['ids'])
+    missing = df.loc[~known & df['Employee Name'].notna().to_numpy(), ['Employee Name', 'Ticket Date']]
+
+    missing = pd.DataFrame({
+        'Employee Name': missing['Employee Name'].astype(object).to_numpy(),
+        'Ticket Date': pd.to_datetime(missing['Ticket Date']).dt.normalize().to_numpy(),
+    }, columns=MISSING_COLUMNS)
+    return missing.drop_duplicates().sort_values(MISSING_COLUMNS, kind='stable').reset_index(drop=True)
+
+
+# Read the employees and days of one or more exports or payroll workbooks
+def read_period(paths):
+    frames = [pd.read_excel(path, usecols=lambda column: column in PERIOD_COLUMNS, dtype={'Employee Name': object})
+              for path in paths]
+    return pd.concat(frames, ignore_index=True)
+
+
+# Write the missing employee report
+def write_missing(path, missing):
+    missing = missing.copy(deep=False)
+    missing['Ticket Date'] = missing['Ticket Date'].dt.strftime('%m/%d/%Y')
+    write_workbook(path, [('Missing Employees', missing, MISSING_WIDTHS, None)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List the employees of a period who are not on the roster.")
+    parser.add_argument('roster', help="Roster workbook with an 'Employee Name' (and 'Employee ID') column")
+    parser.add_argument('exports', nargs='+', help="Clock-in or ticket exports, or Payroll.xlsx workbooks")
+    parser.add_argument('--output', default=MISSING_FILE)
+    parser.add_argument('--cache', metavar='DIRECTORY', help="Keep the parsed roster there, keyed by its contents")
+    parser.add_argument('--match-ids', action='store_true',
+                        help="Also count an employee whose Employee ID is on the roster as known (renamed employees)")
+    args = parser.parse_args(argv)
+
+    missing = missing_employees(read_period(args.exports), load_roster(args.roster, args.cache), args.match_ids)
+    write_missing(args.output, missing)
+    print("%d employees missing from the roster (%d employee days), written to %s" % (
+        missing['Employee Name'].nunique(), len(missing), args.output))
+
+
+if __name__ == '__main__':
+    main()
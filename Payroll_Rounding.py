@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+# Punches are rounded to the nearest 15 minutes: less than 7 minutes past the
+# mark rounds down, 7 minutes or more rounds up
+ROUNDING_INCREMENT = 15
+ROUNDING_THRESHOLD = 7
+
+NANOSECONDS = 1000000000
+
+
+# Round int64 nanosecond timestamps, the same way round_time() rounds a single
+# datetime: the whole seconds past the last mark of the hour decide the
+# direction and the fraction of a second is kept.
+def round_nanoseconds(values, increment=ROUNDING_INCREMENT, threshold=ROUNDING_THRESHOLD):
+    if not 0 <= threshold <= increment:
+        raise ValueError('The rounding threshold must be between 0 and the increment')
+
+    values = np.asarray(values, dtype=np.int64)
+    seconds_past = (values // NANOSECONDS) % 3600 % (increment * 60)
+
+    return np.where(seconds_past < threshold * 60,
+                    values - seconds_past * NANOSECONDS,
+                    values + (increment * 60 - seconds_past) * NANOSECONDS)
+
+
+# Round a column of punches, e.g. round_punches(df['Clock In']) for the
+# default 7 minute rule or round_punches(df['Clock In'], 6, 3) for tenths of
+# an hour. Blank punches stay blank.
+def round_punches(punches, increment=ROUNDING_INCREMENT, threshold=ROUNDING_THRESHOLD):
+    punches = pd.to_datetime(punches)
+    values = punches.to_numpy(dtype='datetime64[ns]')
+    blank = np.isnat(values)
+
+    rounded = round_nanoseconds(values.view(np.int64), increment, threshold)
+    rounded = np.where(blank, values.view(np.int64), rounded).view('datetime64[ns]')
+
+    return pd.Series(rounded, index=punches.index, name=punches.name)
@@ -0,0 +1,165 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# The hour rules of the payroll, in the order they are applied:
+# - a punch of at least 'lunch_after' worked hours loses 'lunch_hours' for lunch
+# - a ticket with a WTL window gets 'wtl_hours' more
+# - the hours of an employee's day are regular up to 'daily_regular', the rest is overtime
+# - the hours of an employee's payroll week are regular up to 'weekly_regular'
+# - every hour worked on one of the 'weekend_days' is overtime
+# - the hours of a day past 'double_time_after' are double time instead of
+#   overtime (None: no double time)
+# - the Errors sheets flag days under 'daily_regular' hours and keep negative
+#   overtime only where 'keep_negative_overtime' is set
+DEFAULT_RULES = {
+    'lunch_after': 5,
+    'lunch_hours': 0.5,
+    'wtl_hours': 0.5,
+    'daily_regular': 8,
+    'weekly_regular': 40,
+    'weekend_days': ['Saturday', 'Sunday'],
+    'double_time_after': None,
+    'keep_negative_overtime': False,
+}
+
+# Overrides of the rules for some agencies or clients; the first override
+# matching a row wins
+DEFAULT_OVERRIDES = [
+    {'agency': 'CSI', 'keep_negative_overtime': True},
+]
+
+# What an override matches on: the text of the column contains the value,
+# ignoring case (as the CSI check always did). The client is looked up in the
+# 'JobNo|Customer|Description' of the ticket.
+MATCH_COLUMNS = {'agency': 'Agency', 'client': 'JobNo|Customer|Description'}
+
+# Rules holding hours, a list of days or a yes/no
+NUMBER_RULES = ['lunch_after', 'lunch_hours', 'wtl_hours', 'daily_regular', 'weekly_regular', 'double_time_after']
+DAYS_RULES = ['weekend_days']
+FLAG_RULES = ['keep_negative_overtime']
+
+# Rules that cannot be left blank
+REQUIRED_RULES = ['lunch_after', 'lunch_hours', 'wtl_hours', 'daily_regular', 'weekly_regular']
+
+
+# Check one set of rules; returns it with the hours as floats
+def checked_rules(rules, where):
+    unknown = [name for name in rules if name not in DEFAULT_RULES and name not in MATCH_COLUMNS]
+    if unknown:
+        raise ValueError("Unknown rules in %s: %s" % (where, ', '.join(unknown)))
+
+    rules = dict(rules)
+    for name in NUMBER_RULES:
+        if name not in rules:
+            continue
+        if rules[name] is None and name not in REQUIRED_RULES:
+            continue
+        try:
+            rules[name] = float(rules[name])
+        except (TypeError, ValueError):
+            raise ValueError("%s in %s must be a number of hours, not %r" % (name, where, rules[name]))
+    for name in DAYS_RULES:
+        if name in rules:
+            rules[name] = list(rules[name])
+    for name in FLAG_RULES:
+        if name in rules:
+            rules[name] = bool(rules[name])
+    return rules
+
+
+# Build the rules of a run from the default rules it changes and its
+# agency or client overrides
+def make_rules(default=None, overrides=None):
+    default = checked_rules(dict(DEFAULT_RULES, **(default or {})), 'the default rules')
+    if overrides is None:
+        overrides = DEFAULT_OVERRIDES
+
+    checked = []
+    for number, override in enumerate(overrides, 1):
+        where = 'override %d' % number
+        if not any(key in override for key in MATCH_COLUMNS):
+            raise ValueError("%s must match on %s" % (where, ' or '.join(MATCH_COLUMNS)))
+        checked.append(checked_rules(override, where))
+    return {'default': default, 'overrides': checked}
+
+
+# Read the rules from a JSON file: {"default": {...}, "overrides": [{"agency": ..., ...}]}
+def load_rules(path):
+    with open(path) as f:
+        data = json.load(f)
+    return make_rules(data.get('default'), data.get('overrides'))
+
+
+# Rules of a run when none are given
+RULES = make_rules()
+
+
+# Values of a rule: its default, and the overrides setting it with their
+# value, in order (a row takes the value of the first one matching it)
+def rule_scopes(name, rules=None):
+    rules = rules or RULES
+    return rules['default'][name], [(override, override[name]) for override in rules['overrides'] if name in override]
+
+
+# Text identifying a set of rules, for cache keys and run states
+def rules_key(rules=None):
+    return json.dumps(rules or RULES, sort_keys=True)
+
+
+# Rows whose column contains 'text', ignoring case; categoricals are matched
+# on their categories only
+def matches(column, text):
+    text = str(text).lower()
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        hits = np.array([text in str(value).lower() for value in column.cat.categories] + [False], dtype=bool)
+        # Blanks have the code -1, which picks the False at the end
+        return hits[column.cat.codes.to_numpy()]
+    values = column.astype(object)
+    return np.array([value == value and value is not None and text in str(value).lower() for value in values],
+                    dtype=bool)
+
+
+# Rows an override applies to
+def scope(df, override):
+    mask = np.ones(len(df), dtype=bool)
+    for key, column in MATCH_COLUMNS.items():
+        if key in override:
+            mask &= matches(df[column], override[key]) if column in df.columns else False
+    return mask
+
+
+# Compile the rules into one column per rule: the value every row of the
+# frame gets, from the first override that matches it or the defaults.
+# The weekend days become a mask of the rows worked on a weekend day.
+def compile_rules(df, rules=None):
+    rules = rules or RULES
+    default = rules['default']
+    scopes = [(scope(df, override), override) for override in rules['overrides']]
+    days = df['Day of the Week'] if 'Day of the Week' in df.columns else pd.Series(np.nan, index=df.index)
+
+    compiled = {}
+    for name in NUMBER_RULES + DAYS_RULES + FLAG_RULES:
+        values = rule_values(name, default[name], days, len(df))
+        # Applied from the last override to the first, so the first match wins
+        for mask, override in reversed(scopes):
+            if name in override:
+                values = np.where(mask, rule_values(name, override[name], days, len(df)), values)
+        compiled[name] = values
+    return pd.DataFrame(compiled, index=df.index)
+
+
+# The value of a rule for every row
+def rule_values(name, value, days, size):
+    if name in DAYS_RULES:
+        return days.isin(value).to_numpy(dtype=bool)
+    if name in FLAG_RULES:
+        return np.full(size, bool(value))
+    return np.full(size, np.nan if value is None else float(value))
+
+
+# The value every row shares, or None when the rows differ (or there are none)
+def uniform(values):
+    values = np.unique(np.asarray(values))
+    return values[0].item() if len(values) == 1 else None
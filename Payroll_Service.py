@@ -0,0 +1,303 @@
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import secrets
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from Payroll_Allocation import WEEK_DAYS, WEEK_START
+from Payroll_Batch import run_job
+from Payroll_Client import SERVICE_HOST, SERVICE_PORT, SERVICE_TOKEN_FILE
+from Payroll_Ingest import read_cached, CLOCK_IN_DATES, CLOCK_IN_DTYPES
+from Payroll_Instrument import RUN_REPORT_FILE, STAGES
+from Payroll_Pipeline import PAYROLL_FILE, PAYROLL_WEEKLY_FILE, PAYROLL_RESUME_FILE, RESULTS_FILE, DUPLICATES_FILE
+from Payroll_Roster import load_roster, missing_employees, read_period, write_missing, MISSING_FILE
+from Payroll_Rules import load_rules
+from Payroll_Stream import SPILL_PARTITIONS
+
+# Options of a job and their defaults, named like the Payroll_Batch.py flags
+JOB_OPTIONS = {
+    'clock_in': None,
+    'tickets': None,
+    'output': None,
+    'rounding': False,
+    'week_start': WEEK_START,
+    'incremental': False,
+    'cache': None,
+    'stream': False,
+    'partitions': SPILL_PARTITIONS,
+    'spill': None,
+    'rules': None,
+    'roster': None,
+    'profile': None,
+    'io_workers': 1,
+    'store': None,
+    'shard_workers': 1,
+}
+REQUIRED_OPTIONS = ['clock_in', 'tickets', 'output']
+
+# Files a run can leave in its output directory
+OUTPUT_FILES = [PAYROLL_FILE, PAYROLL_WEEKLY_FILE, PAYROLL_RESUME_FILE, RESULTS_FILE, DUPLICATES_FILE, MISSING_FILE,
+                RUN_REPORT_FILE]
+
+
+# Check every option has the type of its default: text or null for the
+# paths, true or false for the flags, a whole number of at least 1 for the
+# worker and partition counts
+def check_types(job):
+    for key, value in job.items():
+        default = JOB_OPTIONS[key]
+        if default is None:
+            valid, kind = value is None or isinstance(value, str), "a string or null"
+        elif isinstance(default, bool):
+            valid, kind = isinstance(value, bool), "true or false"
+        elif isinstance(default, int):
+            valid, kind = type(value) is int and value >= 1, "a whole number of at least 1"
+        else:
+            valid, kind = isinstance(value, type(default)), "a string"
+        if not valid:
+            raise ValueError("%s must be %s, not %s" % (key, kind, json.dumps(value)))
+
+
+# Check the options of a job; returns them with the defaults filled in
+def job_options(job):
+    if not isinstance(job, dict):
+        raise ValueError("a job is a JSON object of options")
+    unknown = [key for key in job if key not in JOB_OPTIONS]
+    if unknown:
+        raise ValueError("unknown options: %s" % ', '.join(unknown))
+    check_types(job)
+    missing = [key for key in REQUIRED_OPTIONS if not job.get(key)]
+    if missing:
+        raise ValueError("missing options: %s" % ', '.join(missing))
+
+    options = dict(JOB_OPTIONS, **job)
+    if options['week_start'] not in WEEK_DAYS:
+        raise ValueError("week_start must be one of %s" % ', '.join(WEEK_DAYS))
+    if options['stream'] and (options['incremental'] or options['cache']):
+        raise ValueError("stream cannot be combined with incremental or cache")
+    if options['shard_workers'] > 1 and (options['stream'] or options['incremental']):
+        raise ValueError("shard_workers cannot be combined with stream or incremental")
+    if options['profile'] is not None and options['profile'] not in STAGES:
+        raise ValueError("profile must be one of %s" % ', '.join(STAGES))
+    return options
+
+
+# Modification time of a file, or None when there is no such file
+def modified(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+# Whether only this machine can reach an address
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+# Write a new token to a file only this user can read; clients send it with
+# every request
+def write_token(token_file):
+    token = secrets.token_urlsafe(32)
+    descriptor = os.open(token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w') as f:
+        os.chmod(token_file, 0o600)
+        f.write(token)
+    return token
+
+
+# Nothing to do: gets a worker process started, with the pipeline imported
+def warm():
+    return os.getpid()
+
+
+# Write the employees of the clock-in export missing from the roster. The
+# parsed export comes from the cache when the run used one.
+def check_roster(options):
+    if options['cache']:
+        df = read_cached(options['cache'], 'clock-in', options['clock_in'], None, CLOCK_IN_DTYPES, CLOCK_IN_DATES)[0]
+    else:
+        df = read_period([options['clock_in']])
+    roster = load_roster(options['roster'], options['cache'])
+    write_missing(os.path.join(options['output'], MISSING_FILE), missing_employees(df, roster))
+
+
+# Run a job on a worker: the payroll, with its run report, then the missing
+# employee report when the job gives a roster. Returns the answer to the client.
+def run_service_job(options, rules=None):
+    outputs = [os.path.join(options['output'], name) for name in OUTPUT_FILES]
+    before = [modified(path) for path in outputs]
+    output_directory, seconds, error = run_job(
+        options['clock_in'], options['tickets'], options['output'], options['rounding'], options['week_start'], 1,
+        options['incremental'], options['cache'], True, options['profile'],
+        options['partitions'] if options['stream'] else None, options['spill'], rules, options['io_workers'],
+        options['store'], options['shard_workers'])
+
+    if error is None and options['roster']:
+        try:
+            check_roster(options)
+        except Exception:
+            error = traceback.format_exc()
+
+    report = None
+    report_file = os.path.join(output_directory, RUN_REPORT_FILE)
+    if error is None and os.path.exists(report_file):
+        with open(report_file) as f:
+            report = json.load(f)
+
+    return {
+        'output_directory': output_directory,
+        # Only the files this run wrote, not those left by an earlier one
+        'outputs': [path for path, mtime in zip(outputs, before) if modified(path) not in (None, mtime)],
+        'seconds': round(seconds, 4),
+        'error': error,
+        'report': report,
+    }
+
+
+# A long-lived payroll server: the pipeline stays imported in its worker
+# processes, and the file hashes and rosters they have loaded stay in memory
+# between jobs. Two jobs for the same output directory run one after the other.
+# Only requests carrying 'token' are served (a random one nobody knows when None).
+class PayrollService(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, workers=1, token=None):
+        super().__init__(address, ServiceHandler)
+        self.workers = workers
+        self.token = token or secrets.token_urlsafe(32)
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.outputs = {}
+        self.started = time.time()
+        self.jobs = 0
+        self.failed = 0
+        for _ in range(workers):
+            self.executor.submit(warm)
+
+    # Run a job on the worker pool and wait for its answer
+    def run(self, options, rules=None):
+        with self.lock:
+            output_lock = self.outputs.setdefault(os.path.abspath(options['output']), threading.Lock())
+
+        with output_lock:
+            try:
+                result = self.executor.submit(run_service_job, options, rules).result()
+            except BrokenProcessPool:
+                # A worker died (out of memory, killed): start new ones
+                with self.lock:
+                    self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                result = {'output_directory': options['output'], 'outputs': [], 'seconds': 0,
+                          'error': traceback.format_exc(), 'report': None}
+
+        with self.lock:
+            self.jobs += 1
+            self.failed += result['error'] is not None
+        return result
+
+    def status(self):
+        return {'pid': os.getpid(), 'workers': self.workers, 'jobs': self.jobs, 'failed': self.failed,
+                'uptime_seconds': round(time.time() - self.started, 1)}
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+
+
+# Requests of the service: GET /status, and POST /run with the options of a
+# job as a JSON object. Every request must carry the token of the service, and
+# requests with an Origin are refused: a web page open in a browser of this
+# machine can send requests to the service, but always with its Origin.
+class ServiceHandler(BaseHTTPRequestHandler):
+    # Status and reason when a request may not use the service, else None
+    def refused(self):
+        if self.headers.get('Origin') is not None:
+            return 403, "requests from web pages are refused"
+        expected = ('Bearer %s' % self.server.token).encode()
+        if not hmac.compare_digest(self.headers.get('Authorization', '').encode(), expected):
+            return 401, "missing or wrong token (see the token file of the service)"
+        return None
+
+    def do_GET(self):
+        if self.path != '/status':
+            return self.answer(404, {'error': "unknown path %s" % self.path})
+        refused = self.refused()
+        if refused:
+            return self.answer(refused[0], {'error': refused[1]})
+        self.answer(200, self.server.status())
+
+    def do_POST(self):
+        if self.path != '/run':
+            return self.answer(404, {'error': "unknown path %s" % self.path})
+        refused = self.refused()
+        if refused:
+            return self.answer(refused[0], {'error': refused[1]})
+        # Plain-text and form posts are never jobs
+        if self.headers.get_content_type() != 'application/json':
+            return self.answer(415, {'error': "a job must be sent as application/json"})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            options = job_options(json.loads(self.rfile.read(length) or b'null'))
+            rules = load_rules(options['rules']) if options['rules'] else None
+        except (OSError, ValueError) as e:
+            return self.answer(400, {'error': str(e)})
+
+        result = self.server.run(options, rules)
+        self.answer(500 if result['error'] else 200, result)
+
+    def answer(self, code, value):
+        body = json.dumps(value, default=str).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve payroll runs to Payroll_Client.py from warm processes.")
+    parser.add_argument('--host', default=SERVICE_HOST,
+                        help="Address to listen on (default: %(default)s, this machine only)")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT)
+    parser.add_argument('--workers', type=int, default=1, help="Payroll runs at the same time (default: %(default)s)")
+    parser.add_argument('--token-file', default=SERVICE_TOKEN_FILE,
+                        help="File to write the token of the clients to (default: %(default)s)")
+    parser.add_argument('--allow-remote', action='store_true',
+                        help="Allow a --host other machines can reach. The token is sent over plain HTTP: anyone "
+                             "who sees it can read and write any file this user can")
+    args = parser.parse_args(argv)
+
+    # A job names the files to read and write, so the service must not be
+    # reachable from other machines unless that is asked for
+    if not is_loopback(args.host):
+        if not args.allow_remote:
+            parser.error("--host %s can be reached from other machines and the token is sent over plain HTTP; "
+                         "use a loopback address, or --allow-remote to accept the risk" % args.host)
+        print("WARNING: the payroll service on %s sends its token over plain HTTP; anyone who sees it can read "
+              "and write any file this user can" % args.host)
+
+    server = PayrollService((args.host, args.port), args.workers, write_token(args.token_file))
+    print("Payroll service listening on http://%s:%d with %d workers (token in %s)"
+          % (args.host, args.port, args.workers, args.token_file))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
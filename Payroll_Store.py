@@ -0,0 +1,338 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+from Payroll_Cache import file_hash
+from Payroll_Encoding import encode
+from Payroll_Ingest import CLOCK_IN_DATES, TICKET_COLUMNS, TICKET_DATES
+
+# Columns kept of every frame, and their names in the store. The clock-in and
+# ticket rows are those of the exports, so a run can be rebuilt from the store.
+PUNCH_COLUMNS = {'Ticket Date': 'ticket_date', 'Employee Name': 'employee_name', 'Clock In': 'clock_in',
+                 'Clock Out': 'clock_out', 'Hours Worked': 'hours_worked', 'JobNo|Customer|Description': 'job',
+                 'Email': 'email'}
+STORE_TICKET_COLUMNS = dict(zip(TICKET_COLUMNS, [
+    'employee_name', 'employee_id', 'ticket_date', 'agency', 'clock_in_id', 'supervisor', 'pm_assigned', 'job',
+    'wtl_approved', 'wtl_start_date', 'wtl_end_date', 'approved_overtime', 'approved_overtime_start_date',
+    'approved_overtime_end_date']))
+ALLOCATION_COLUMNS = {'Ticket Date': 'ticket_date', 'Employee Name': 'employee_name', 'Employee ID': 'employee_id',
+                      'Agency': 'agency', 'Supervisors Name': 'supervisor', 'PM Assigned': 'pm_assigned',
+                      'JobNo|Customer|Description': 'job', 'Clock In': 'clock_in', 'Clock Out': 'clock_out',
+                      'Hours Worked': 'hours_worked', 'Lunch Adjusted': 'lunch_adjusted',
+                      'Regular Time': 'regular_time', 'Overtime': 'overtime', 'Double Time': 'double_time',
+                      'Weekly Regular Time': 'weekly_regular_time', 'Weekly Overtime': 'weekly_overtime'}
+TABLES = {'punches': PUNCH_COLUMNS, 'tickets': STORE_TICKET_COLUMNS, 'allocations': ALLOCATION_COLUMNS}
+
+# Dates are kept as ISO text, which sorts and compares as the dates do
+DATE_COLUMNS = set(CLOCK_IN_DATES + TICKET_DATES)
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+NUMBER_COLUMNS = {'Hours Worked', 'Employee ID', 'Clock-In ID', 'Lunch Adjusted', 'Regular Time', 'Overtime',
+                  'Double Time', 'Weekly Regular Time', 'Weekly Overtime'}
+
+# Indexes of the period queries: by employee and day, by job and by supervisor
+INDEXES = {
+    'punches': [('run_id', 'row'), ('employee_name', 'ticket_date')],
+    'tickets': [('run_id', 'row'), ('employee_name', 'ticket_date'), ('job',), ('supervisor',)],
+    'allocations': [('run_id',), ('employee_name', 'ticket_date'), ('ticket_date',), ('job',), ('supervisor',)],
+}
+
+# Seconds a run waits for another one writing to the same store
+STORE_TIMEOUT = 60
+
+
+# Statements creating the tables and indexes of a store
+def schema():
+    statements = ["CREATE TABLE IF NOT EXISTS runs (run_id INTEGER PRIMARY KEY AUTOINCREMENT, run TEXT NOT NULL, "
+                  "started TEXT NOT NULL, completed TEXT, clock_in_file TEXT, clock_in_hash TEXT, "
+                  "tickets_file TEXT, tickets_hash TEXT, settings TEXT NOT NULL)"]
+    for table, columns in TABLES.items():
+        definitions = ['%s %s' % (name, 'REAL' if column in NUMBER_COLUMNS else 'TEXT')
+                       for column, name in columns.items()]
+        statements.append("CREATE TABLE IF NOT EXISTS %s (run_id INTEGER NOT NULL REFERENCES runs (run_id), "
+                          "row INTEGER NOT NULL, %s)" % (table, ', '.join(definitions)))
+        for index in INDEXES[table]:
+            statements.append("CREATE INDEX IF NOT EXISTS %s_%s ON %s (%s)" % (
+                table, '_'.join(index), table, ', '.join(index)))
+    return ';\n'.join(statements) + ';'
+
+
+# Open a store, creating it when it does not exist yet. Runs of a batch can
+# write to the same store: readers do not block the writer.
+def connect(store_file):
+    con = sqlite3.connect(store_file, timeout=STORE_TIMEOUT)
+    con.execute('PRAGMA journal_mode=WAL')
+    con.executescript(schema())
+    return con
+
+
+# Values of a column for SQLite: ISO text for dates and None for blanks
+def sql_values(column):
+    if pd.api.types.is_datetime64_any_dtype(column):
+        column = column.dt.strftime(DATE_FORMAT)
+    values = column.astype(object)
+    return values.where(values.notna(), None).tolist()
+
+
+# Insert the rows of a frame into a table of the run, in one statement. The
+# row is the index of the frame, which keeps the order of the export.
+def insert_frame(con, table, run_id, df):
+    columns = TABLES[table]
+    df = df.reindex(columns=list(columns))
+    values = [sql_values(df[column]) for column in columns]
+    con.executemany("INSERT INTO %s (run_id, row, %s) VALUES (?, ?%s)" % (
+        table, ', '.join(columns.values()), ', ?' * len(columns)),
+        zip([run_id] * len(df), df.index.tolist(), *values))
+
+
+# Record a run in the store; returns its id. Its rows are added by
+# store_exports and store_allocations, and finish_run marks it complete.
+def start_run(store_file, run, clockIn_File, payRoll_File, rounding, week_start, rules):
+    settings = json.dumps({'rounding': rounding, 'week_start': week_start, 'rules': rules})
+    with closing(connect(store_file)) as con, con:
+        cursor = con.execute(
+            "INSERT INTO runs (run, started, clock_in_file, clock_in_hash, tickets_file, tickets_hash, settings) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run, datetime.now().isoformat(timespec='seconds'), os.path.abspath(clockIn_File),
+             file_hash(clockIn_File), os.path.abspath(payRoll_File), file_hash(payRoll_File), settings))
+        return cursor.lastrowid
+
+
+# Store the punches and tickets of a run as they were read, before the
+# merge rounds the punches. Either may be None (a streamed partition).
+def store_exports(store_file, run_id, df1, df2):
+    with closing(connect(store_file)) as con, con:
+        if df1 is not None:
+            insert_frame(con, 'punches', run_id, df1)
+        if df2 is not None:
+            insert_frame(con, 'tickets', run_id, df2)
+
+
+# Store the allocated tickets of a run: the Payroll sheet rows, with the
+# Regular Time and Overtime of the PayrollWeekly sheet next to them
+def store_allocations(store_file, run_id, payroll_df, weekly_df):
+    df = payroll_df.copy(deep=False)
+    df['Weekly Regular Time'] = weekly_df['Regular Time']
+    df['Weekly Overtime'] = weekly_df['Overtime']
+    if 'Double Time' not in df.columns:
+        df['Double Time'] = 0.0
+    with closing(connect(store_file)) as con, con:
+        insert_frame(con, 'allocations', run_id, df)
+
+
+# Mark a run as complete; the queries only read complete runs
+def finish_run(store_file, run_id):
+    with closing(connect(store_file)) as con, con:
+        con.execute("UPDATE runs SET completed = ? WHERE run_id = ?",
+                    (datetime.now().isoformat(timespec='seconds'), run_id))
+
+
+# Delete the rows of a run that did not complete
+def discard_run(store_file, run_id):
+    with closing(connect(store_file)) as con, con:
+        for table in TABLES:
+            con.execute("DELETE FROM %s WHERE run_id = ?" % table, (run_id,))
+        con.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+
+
+# Record a run around the block and yield its id (None without a store).
+# A run that fails is discarded rather than left incomplete in the store.
+@contextmanager
+def stored_run(store_file, run, clockIn_File, payRoll_File, rounding, week_start, rules):
+    if not store_file:
+        yield None
+        return
+    run_id = start_run(store_file, run, clockIn_File, payRoll_File, rounding, week_start, rules)
+    try:
+        yield run_id
+    except BaseException:
+        discard_run(store_file, run_id)
+        raise
+    finish_run(store_file, run_id)
+
+
+# Text of a day for the queries
+def day(value):
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
+
+
+# Rows of a table between two days (both included) as a DataFrame, with the
+# frame column names and a 'Run' column. When runs overlap, every
+# employee-day comes from the latest complete run holding it, unless
+# 'run_id' picks one run.
+def query(store_file, table='allocations', employee=None, start=None, end=None, job=None, supervisor=None,
+          run_id=None):
+    if table not in TABLES:
+        raise ValueError("table must be one of %s" % ', '.join(TABLES))
+    if supervisor is not None and 'supervisor' not in TABLES[table].values():
+        raise ValueError("the %s have no supervisor" % table)
+
+    # Filters of the employee-days, which the (employee, ticket date) index covers
+    where, params = ['runs.completed IS NOT NULL'], []
+    if employee is not None:
+        where.append('t.employee_name = ?')
+        params.append(employee)
+    if start is not None:
+        where.append('t.ticket_date >= ?')
+        params.append(day(start))
+    if end is not None:
+        where.append('t.ticket_date < ?')
+        params.append(day(pd.Timestamp(end) + pd.Timedelta(days=1)))
+    if run_id is not None:
+        where.append('t.run_id = ?')
+        params.append(run_id)
+
+    filters, filter_params = [], []
+    if job is not None:
+        filters.append('t.job = ?')
+        filter_params.append(job)
+    if supervisor is not None:
+        filters.append('t.supervisor = ?')
+        filter_params.append(supervisor)
+
+    columns = TABLES[table]
+    sql = ("WITH latest AS (SELECT t.employee_name, substr(t.ticket_date, 1, 10) AS day, MAX(t.run_id) AS run_id "
+           "FROM {table} t JOIN runs USING (run_id) WHERE {where} GROUP BY t.employee_name, day) "
+           "SELECT t.run_id AS run_id, {columns} FROM {table} t JOIN latest ON t.run_id = latest.run_id "
+           "AND t.employee_name IS latest.employee_name AND substr(t.ticket_date, 1, 10) = latest.day "
+           "{filters} ORDER BY t.ticket_date, t.run_id, t.row").format(
+        table=table, where=' AND '.join(where), columns=', '.join('t.' + name for name in columns.values()),
+        filters='WHERE ' + ' AND '.join(filters) if filters else '')
+
+    with closing(connect(store_file)) as con:
+        df = pd.read_sql_query(sql, con, params=params + filter_params)
+    return frame(df.rename(columns={'run_id': 'Run'}), columns)
+
+
+# Frame of store rows: the frame column names, dates parsed and blank text as NaN
+def frame(df, columns):
+    df = df.rename(columns={name: column for column, name in columns.items()})
+    for column in df.columns:
+        if column in DATE_COLUMNS:
+            df[column] = pd.to_datetime(df[column], format='ISO8601')
+        elif column in NUMBER_COLUMNS:
+            df[column] = df[column].astype(float)
+        elif df[column].dtype == object:
+            df[column] = df[column].where(df[column].notna(), float('nan'))
+    return df
+
+
+# Runs of the store, newest first, with their row counts
+def list_runs(store_file):
+    counts = ', '.join("(SELECT COUNT(*) FROM %s WHERE %s.run_id = runs.run_id) AS %s" % (table, table, table)
+                       for table in TABLES)
+    with closing(connect(store_file)) as con:
+        return pd.read_sql_query("SELECT runs.*, %s FROM runs ORDER BY run_id DESC" % counts, con)
+
+
+# Settings of a run: rounding, week_start and rules
+def run_settings(store_file, run_id):
+    with closing(connect(store_file)) as con:
+        row = con.execute("SELECT settings FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+    if row is None:
+        raise ValueError("there is no run %s in %s" % (run_id, store_file))
+    return json.loads(row[0])
+
+
+# Punches and tickets of a run as ingest reads them from the exports
+def load_exports(store_file, run_id):
+    frames = []
+    with closing(connect(store_file)) as con:
+        for table in ('punches', 'tickets'):
+            columns = TABLES[table]
+            df = pd.read_sql_query("SELECT row, %s FROM %s WHERE run_id = ? ORDER BY row" % (
+                ', '.join(columns.values()), table), con, params=(run_id,), index_col='row')
+            df.index.name = None
+            df = frame(df, columns)
+            encode(df)
+            frames.append(df)
+    encode(*frames)
+    return frames
+
+
+# Compute the payroll of a stored run again and write its workbooks, without
+# the original exports
+def rebuild(store_file, run_id, output_directory, workers=1, io_workers=1):
+    # Payroll_Pipeline imports this module
+    from Payroll_Pipeline import allocate, merge, print_duplicates, render, validate
+
+    settings = run_settings(store_file, run_id)
+    df1, df2 = load_exports(store_file, run_id)
+    if not len(df1):
+        raise ValueError("run %s has no punches in %s" % (run_id, store_file))
+    rules, week_start = settings['rules'], settings['week_start']
+
+    merged_df, duplicates_df = merge(df1, df2, settings['rounding'], rules)
+    print_duplicates(duplicates_df)
+    merged_df, payroll_df, merged_weekly_df = allocate(merged_df, week_start, workers, rules)
+    errors_df, weekly_errors_df = validate(merged_df, merged_weekly_df, rules)
+    os.makedirs(output_directory, exist_ok=True)
+    render(output_directory, merged_df, payroll_df, errors_df, merged_weekly_df, weekly_errors_df, week_start,
+           workers, duplicates_df, rules, io_workers)
+
+
+# Write a query result to an .xlsx or .csv file
+def write_query(path, df):
+    if path.lower().endswith('.csv'):
+        df.to_csv(path, index=False)
+    else:
+        df.to_excel(path, index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the payroll runs kept in a timesheet store.")
+    parser.add_argument('store', help="SQLite file written by runs given --store")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    commands.add_parser('runs', help="List the runs of the store")
+
+    query_parser = commands.add_parser('query', help="Rows of a period, from the latest run of every employee-day")
+    query_parser.add_argument('table', nargs='?', default='allocations', choices=list(TABLES))
+    query_parser.add_argument('--employee', help="Employee Name")
+    query_parser.add_argument('--start', help="First ticket date (YYYY-MM-DD)")
+    query_parser.add_argument('--end', help="Last ticket date (YYYY-MM-DD)")
+    query_parser.add_argument('--job', help="JobNo|Customer|Description")
+    query_parser.add_argument('--supervisor', help="Supervisors Name")
+    query_parser.add_argument('--run', type=int, help="Only this run")
+    query_parser.add_argument('--output', metavar='FILE', help="Write the rows to an .xlsx or .csv file")
+
+    rebuild_parser = commands.add_parser('rebuild', help="Write the workbooks of a run again from the store")
+    rebuild_parser.add_argument('run', type=int)
+    rebuild_parser.add_argument('output', help="Output directory")
+    rebuild_parser.add_argument('--workers', type=int, default=1)
+    rebuild_parser.add_argument('--io-workers', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.store):
+        parser.error("there is no store %s" % args.store)
+
+    if args.command == 'runs':
+        runs = list_runs(args.store).drop(columns=['settings', 'clock_in_hash', 'tickets_hash'])
+        with pd.option_context('display.width', 200, 'display.max_columns', None):
+            print(runs.to_string(index=False))
+    elif args.command == 'query':
+        try:
+            df = query(args.store, args.table, args.employee, args.start, args.end, args.job, args.supervisor,
+                       args.run)
+        except ValueError as e:
+            parser.error(str(e))
+        if args.output:
+            write_query(args.output, df)
+        else:
+            with pd.option_context('display.width', 200, 'display.max_columns', None):
+                print(df.to_string(index=False, max_rows=50))
+        print("%d rows" % len(df))
+        if args.table == 'allocations':
+            print(df[['Regular Time', 'Overtime', 'Double Time']].sum().round(2).to_string())
+    else:
+        rebuild(args.store, args.run, args.output, args.workers, args.io_workers)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
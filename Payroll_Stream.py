@@ -0,0 +1,332 @@
+import os
+import pickle
+import tempfile
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from pandas.io.parsers import TextParser
+
+from Payroll_Allocation import WEEK_START
+from Payroll_Encoding import encode, decode, sorted_categories
+from Payroll_Ingest import CLOCK_IN_DATES, CLOCK_IN_DTYPES, TICKET_COLUMNS, TICKET_DATES, TICKET_DTYPES
+from Payroll_Instrument import start_report, timed, write_report
+from Payroll_IO import run_jobs
+from Payroll_Join import first_rows, DUPLICATE_COLUMNS
+from Payroll_Pipeline import (merge, allocate, validate, resume_weeks, with_budget, payroll_sheet, display_dates,
+                              print_duplicates, sheet_keys, PAYROLL_FILE, PAYROLL_WEEKLY_FILE, PAYROLL_RESUME_FILE,
+                              RESULTS_FILE, DUPLICATES_FILE)
+from Payroll_Render import (write_workbook, errors_styles, PAYROLL_STYLES, PAYROLL_WIDTHS, ERRORS_WIDTHS,
+                            RESUME_WIDTHS, DUPLICATES_WIDTHS, RESULTS_WIDTHS)
+from Payroll_Reports import build_results
+from Payroll_Rules import compile_rules, rule_scopes
+from Payroll_Store import stored_run, store_exports, store_allocations
+
+# Employee partitions the exports are split into; a partition is the most
+# that is held in memory at once
+SPILL_PARTITIONS = 16
+
+# Rows read from an export, and written to a spill file, at a time
+READ_ROWS = 50000
+SPILL_ROWS = 10000
+
+
+################################################
+# READ
+
+# Convert one cell the way read_excel does with openpyxl
+def excel_cell(cell):
+    if cell.value is None:
+        return ''
+    if cell.data_type == TYPE_ERROR:
+        return np.nan
+    if cell.data_type == TYPE_NUMERIC:
+        value = int(cell.value)
+        return value if value == cell.value else float(cell.value)
+    return cell.value
+
+
+# Rows of the first sheet of a workbook, read one at a time. Trailing empty
+# cells are dropped, and so are the empty rows at the end of the sheet.
+def excel_rows(path):
+    wb = load_workbook(path, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()
+        blank_rows = []
+        for row in ws.rows:
+            values = [excel_cell(cell) for cell in row]
+            while values and values[-1] == '':
+                values.pop()
+            if not values:
+                blank_rows.append(values)
+                continue
+            yield from blank_rows
+            blank_rows = []
+            yield values
+    finally:
+        wb.close()
+
+
+# Read an export 'chunk_rows' rows at a time, parsed like read_export; the
+# rows are numbered across the chunks as read_excel numbers them
+def read_chunks(path, columns=None, dtypes=None, dates=(), chunk_rows=READ_ROWS):
+    rows = excel_rows(path)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    usecols = None if columns is None else (lambda column: column in columns)
+    start = 0
+    for chunk in iter(lambda: list(islice(rows, chunk_rows)), []):
+        width = max(len(row) for row in [header] + chunk)
+        data = [row + [''] * (width - len(row)) for row in [header] + chunk]
+        df = TextParser(data, header=0, dtype=dtypes, usecols=usecols, skip_blank_lines=False).read()
+
+        # A missing column raises a KeyError, as selecting it did
+        if columns is not None:
+            df = df[columns]
+        for column in dates:
+            if column in df.columns:
+                df[column] = pd.to_datetime(df[column])
+
+        df.index = pd.RangeIndex(start, start + len(df))
+        start += len(df)
+        yield df
+
+
+################################################
+# SPILL
+
+# Spill file of a partition
+def spill_path(directory, kind, partition):
+    return os.path.join(directory, '%s-%d.pkl' % (kind, partition))
+
+
+# Append a frame (or anything else) to a spill file
+def spill(path, value):
+    with open(path, 'ab') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# Everything spilled to a file, in order
+def spilled(path):
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+# Partition of every row: a stable hash of the employee name, so the punches
+# and the tickets of an employee land in the same partition
+def partition_of(names, partitions):
+    names = names.astype(object).where(names.notna(), '').astype(str).to_numpy()
+    return (pd.util.hash_array(names) % partitions).astype(int)
+
+
+# Spill the rows of a chunk to the files of their partitions
+def spill_partitions(directory, kind, df, partitions):
+    partition = partition_of(df['Employee Name'], partitions)
+    for number in np.unique(partition):
+        spill(spill_path(directory, kind, number), df[partition == number])
+
+
+# Read one export chunk by chunk and split it into employee partitions.
+# Returns the employee names and the number of rows.
+def partition_export(path, kind, columns, dtypes, dates, directory, partitions=SPILL_PARTITIONS):
+    names = set()
+    rows = 0
+    for df in read_chunks(path, columns, dtypes, dates):
+        names.update(df['Employee Name'].dropna())
+        spill_partitions(directory, kind, df, partitions)
+        rows += len(df)
+    return names, rows
+
+
+# Read both exports chunk by chunk and split them into employee partitions,
+# both at the same time with 'io_workers' above 1. Returns the employee
+# names of the punches, sorted like the categories of the sheets.
+def partition_exports(clockIn_File, payRoll_File, directory, partitions=SPILL_PARTITIONS, io_workers=1):
+    (names, clock_in_rows), (_, ticket_rows) = run_jobs([
+        (partition_export, clockIn_File, 'clock-in', None, CLOCK_IN_DTYPES, CLOCK_IN_DATES, directory, partitions),
+        (partition_export, payRoll_File, 'tickets', TICKET_COLUMNS, TICKET_DTYPES, TICKET_DATES, directory,
+         partitions),
+    ], io_workers)
+
+    print("Split %d clock-in rows and %d ticket rows into %d employee partitions" % (
+        clock_in_rows, ticket_rows, partitions))
+    return pd.Index(sorted_categories(pd.Series(list(names), dtype=object)))
+
+
+# Ticket frame without rows, for a partition whose employees have no tickets
+def empty_tickets():
+    df = pd.DataFrame({column: pd.Series(dtype=TICKET_DTYPES.get(column, object)) for column in TICKET_COLUMNS})
+    for column in TICKET_DATES:
+        df[column] = pd.to_datetime(df[column])
+    return df
+
+
+# Frame spilled for a partition, or None when it has no rows
+def load_partition(directory, kind, partition):
+    frames = list(spilled(spill_path(directory, kind, partition)))
+    return pd.concat(frames) if frames else None
+
+
+################################################
+# PARTITIONS
+
+# Merge, allocate and validate the rows of one partition and build the rows
+# of every sheet, ready for display. With a 'store_file' the allocations of
+# the partition are added to the run 'run_id' of the store.
+def process_partition(df1, df2, rounding=False, week_start=WEEK_START, workers=1, report=None, rules=None,
+                      store_file=None, run_id=None):
+    if df1 is None:
+        # Tickets without punches only show up on the duplicate report
+        return {'duplicates': first_rows(df2, 'Ticket')[1].reindex(columns=DUPLICATE_COLUMNS)}
+    if df2 is None:
+        df2 = empty_tickets()
+
+    encode(df1, df2)
+    merged_df, duplicates_df = timed(report, 'merge', merge, df1, df2, rounding, rules)
+    merged_df, payroll_df, merged_weekly_df = timed(report, 'allocate', allocate, merged_df, week_start, workers,
+                                                    rules)
+    errors_df, weekly_errors_df = timed(report, 'validate', validate, merged_df, merged_weekly_df, rules)
+
+    payroll_df = payroll_sheet(payroll_df)
+    weekly_df = payroll_sheet(merged_weekly_df)
+    if store_file:
+        timed(report, 'store', store_allocations, store_file, run_id, payroll_df, weekly_df)
+    resume_df, budget = with_budget(merged_df, compile_rules(merged_df, rules)['weekly_regular'])
+    return {
+        'weekly': display_dates(weekly_df),
+        'weekly_errors': display_dates(weekly_errors_df),
+        'resume': resume_weeks(resume_df, week_start, workers, budget),
+        'payroll': display_dates(payroll_df),
+        'errors': display_dates(errors_df),
+        'results': build_results(payroll_df),
+        'duplicates': duplicates_df,
+    }
+
+
+# Spill the sheets of a partition, sorted by their keys, in pieces
+def spill_sheets(directory, partition, sheets, employees, columns):
+    for sheet, df in sheets.items():
+        keys = sheet_keys(sheet, df, employees)
+        order = np.argsort(keys, kind='stable')
+        keys, df = keys[order], decode(df.iloc[order])
+        columns.setdefault(sheet, list(df.columns))
+        for start in range(0, len(df), SPILL_ROWS):
+            spill(spill_path(directory, sheet, partition), (keys[start:start + SPILL_ROWS],
+                                                              df.iloc[start:start + SPILL_ROWS]))
+
+
+# Merge pieces sorted by key from several runs into frames in key order.
+# Every row up to the smallest last key of the pieces at hand can go out, so
+# at most one piece per run is held at a time.
+def merge_sorted(runs):
+    runs = [iter(run) for run in runs]
+    pending = {number: piece for number, piece in enumerate(next(run, None) for run in runs) if piece is not None}
+    while pending:
+        limit = min(keys[-1] for keys, df in pending.values())
+        keys_out, frames_out = [], []
+        for number in list(pending):
+            keys, df = pending[number]
+            size = np.searchsorted(keys, limit, side='right')
+            keys_out.append(keys[:size])
+            frames_out.append(df.iloc[:size])
+            if size < len(keys):
+                pending[number] = (keys[size:], df.iloc[size:])
+            else:
+                piece = next(runs[number], None)
+                if piece is None:
+                    del pending[number]
+                else:
+                    pending[number] = piece
+        order = np.argsort(np.concatenate(keys_out), kind='stable')
+        yield pd.concat(frames_out).iloc[order]
+
+
+# A sheet as (columns, frames) for write_workbook, merged from the spill files
+# of every partition
+def sheet_stream(directory, sheet, partitions, columns):
+    runs = [(piece for piece in spilled(spill_path(directory, sheet, number)) if len(piece[0]))
+            for number in range(partitions)]
+    return columns[sheet], (df.reindex(columns=columns[sheet]) for df in merge_sorted(runs))
+
+
+# Write a workbook from spilled sheets, given as (sheet name, spilled sheet,
+# widths, styles)
+def write_spilled(path, sheets, directory, partitions, columns):
+    write_workbook(path, [(name, sheet_stream(directory, sheet, partitions, columns), widths, styles)
+                          for name, sheet, widths, styles in sheets])
+
+
+# Write the output workbooks from the spilled sheets. Every sheet has its own
+# spill files, so with 'io_workers' above 1 the workbooks are written at the
+# same time.
+def render_spilled(output_directory, directory, partitions, columns, io_workers=1, rules=None):
+    def job(file, sheets):
+        return write_spilled, os.path.join(output_directory, file), sheets, directory, partitions, columns
+
+    errors_style = errors_styles(*rule_scopes('daily_regular', rules))
+    run_jobs([
+        job(PAYROLL_WEEKLY_FILE, [('Payroll', 'weekly', PAYROLL_WIDTHS, PAYROLL_STYLES),
+                                  ('Errors', 'weekly_errors', ERRORS_WIDTHS, errors_style)]),
+        job(PAYROLL_RESUME_FILE, [("PayrollWeekly_Resume", 'resume', RESUME_WIDTHS, None)]),
+        job(PAYROLL_FILE, [('Payroll', 'payroll', PAYROLL_WIDTHS, PAYROLL_STYLES),
+                           ('Errors', 'errors', ERRORS_WIDTHS, errors_style)]),
+        job(RESULTS_FILE, [('Sheet1', 'results', RESULTS_WIDTHS, None)]),
+        job(DUPLICATES_FILE, [('Duplicates', 'duplicates', DUPLICATES_WIDTHS, None)]),
+    ], io_workers)
+
+
+################################################
+# RUN
+
+# Run the payroll out of core: the exports are read in chunks and split by
+# employee into spill files, every partition goes through merge, allocation
+# and errors on its own, and the sheets are merged back into the order of a
+# normal run while they are streamed to the workbooks. Only one partition
+# (and one piece of every partition while rendering) is in memory at a time.
+def run_payroll_streaming(clockIn_File, payRoll_File, output_directory, rounding=False, week_start=WEEK_START,
+                          workers=1, partitions=SPILL_PARTITIONS, spill_directory=None, run_report=False,
+                          profile_stage=None, rules=None, io_workers=1, store_file=None):
+    report = None
+    if run_report or profile_stage:
+        report = start_report('streaming', [clockIn_File, payRoll_File],
+                              {'rounding': rounding, 'week_start': week_start, 'workers': workers,
+                               'partitions': partitions, 'rules': rules, 'io_workers': io_workers,
+                               'store_file': store_file}, profile_stage)
+
+    with tempfile.TemporaryDirectory(prefix='payroll-spill-', dir=spill_directory) as directory:
+        employees = timed(report, 'ingest', partition_exports, clockIn_File, payRoll_File, directory, partitions,
+                          io_workers)
+        if not len(employees):
+            raise ValueError("No punches found in %s" % clockIn_File)
+        with stored_run(store_file, 'streaming', clockIn_File, payRoll_File, rounding, week_start, rules) as run_id:
+            columns = {}
+            duplicates = []
+            for number in range(partitions):
+                df1 = load_partition(directory, 'clock-in', number)
+                df2 = load_partition(directory, 'tickets', number)
+                if df1 is None and df2 is None:
+                    continue
+                if store_file:
+                    timed(report, 'store', store_exports, store_file, run_id, df1, df2)
+                sheets = process_partition(df1, df2, rounding, week_start, workers, report, rules, store_file, run_id)
+                duplicates.append(sheets['duplicates'][['Source', 'Kept']])
+                spill_sheets(directory, number, sheets, employees, columns)
+                del df1, df2, sheets
+
+            print_duplicates(pd.concat(duplicates, ignore_index=True))
+            timed(report, 'render', render_spilled, output_directory, directory, partitions, columns, io_workers,
+                  rules)
+
+    if report is not None:
+        write_report(report, output_directory)
@@ -0,0 +1,117 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The payroll modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Payroll_Rules import make_rules  # noqa: E402
+
+# Employees, jobs and agencies of the test exports
+EMPLOYEES = ['Cruz, Alan', 'Silva, Juan', 'Hughes, Chris', 'Garcia, Ana', 'Tolleson, Michael', 'Badillo, Brayan',
+             'Hodnett, Daniel', 'Magenheimer, Wayne']
+JOBS = ['4000 | Alabama Power Company | Plant Barry Unit 5 Outage',
+        '4001 | Emergent Construction Technologies | ALDOT Bridge Retrofit',
+        '4002 | Hyundai Motor Manufacturing | Body Shop Expansion',
+        '4003 | Barry-Wehmiller Design Group | 3450 MET Expansion Phase II']
+AGENCIES = ['ECO Staffing', 'Outsource.net', 'CSI Staffing', None]
+
+
+# Clock-in and ticket frames shaped like the exports: two payroll weeks of
+# back to back punches, some days over 8 hours and weeks over 40, a missing
+# Clock Out, tickets exported twice, a punch without a ticket, WTL and
+# ApprovedOvertime windows and blank agencies
+def export_frames(seed=0, days=14):
+    rng = np.random.default_rng(seed)
+    punches, tickets = [], []
+    for number, name in enumerate(EMPLOYEES):
+        agency = AGENCIES[number % len(AGENCIES)]
+        for date in pd.date_range('2023-06-05', periods=days):
+            if rng.random() > (0.2 if date.dayofweek >= 5 else 0.9):
+                continue
+            clock_in = date + pd.Timedelta(seconds=int(6 * 3600 + rng.integers(3600)))
+            for job in rng.choice(JOBS, int(rng.integers(1, 4)), replace=False):
+                clock_out = clock_in + pd.Timedelta(seconds=int(rng.gamma(4, 3.5 * 3600 / 4)))
+                hours = (clock_out - clock_in).seconds / 3600
+                punches.append({'Ticket Date': date, 'Employee Name': name, 'Clock In': clock_in,
+                                'Clock Out': clock_out, 'Hours Worked': round(hours, 2),
+                                'JobNo|Customer|Description': job, 'Email': 'employee%d@example.com' % number})
+                wtl, approved = rng.random() < 0.1, rng.random() < 0.2
+                tickets.append({'Ticket Date': date, 'JobNo|Customer|Description': job, 'Employee Name': name,
+                                'Employee ID': 1000 + number, 'Clock-In ID': 1000 + number, 'Agency': agency,
+                                'Actual Hrs': max(1, round(hours)),
+                                'Retrieved Status': 'Pending', 'Temp Agency Name': agency,
+                                'Supervisors Name': 'Hughes, Chris', 'PM Assigned': 'Tolleson, Michael',
+                                'WTL Approved': 'Yes' if wtl else None,
+                                'WTL Start Date': date if wtl else None, 'WTL End Date': date if wtl else None,
+                                'ApprovedOvertime': 'Yes' if approved else None,
+                                'ApprovedOvertime Start Date': date if approved else None,
+                                'ApprovedOvertime End Date': date if approved else None})
+                clock_in = clock_out
+
+    clock_in_df, tickets_df = pd.DataFrame(punches), pd.DataFrame(tickets)
+    clock_in_df.loc[3, ['Clock Out', 'Hours Worked']] = [pd.NaT, np.nan]
+    tickets_df = pd.concat([tickets_df, tickets_df.iloc[[5, 40]]]).sort_index(kind='stable')
+    tickets_df = tickets_df.drop(tickets_df.index[20]).reset_index(drop=True)
+    for column in ['WTL Start Date', 'WTL End Date', 'ApprovedOvertime Start Date', 'ApprovedOvertime End Date']:
+        tickets_df[column] = pd.to_datetime(tickets_df[column])
+    return clock_in_df, tickets_df
+
+
+# The frames of the test exports
+@pytest.fixture
+def frames():
+    return export_frames()
+
+
+# The test exports written as workbooks; returns their paths
+@pytest.fixture
+def exports(tmp_path, frames):
+    paths = str(tmp_path / 'clockin.xlsx'), str(tmp_path / 'tickets.xlsx')
+    for df, path in zip(frames, paths):
+        df.to_excel(path, index=False)
+    return paths
+
+
+# Overtime rules with double time, an agency with longer days and weeks and
+# a client working Saturdays at the regular rate
+@pytest.fixture
+def rules():
+    return make_rules({'double_time_after': 12},
+                      [{'agency': 'ECO', 'daily_regular': 10, 'weekly_regular': 50, 'lunch_after': 6},
+                       {'client': 'Alabama Power', 'weekend_days': ['Sunday'], 'double_time_after': None},
+                       {'agency': 'CSI', 'keep_negative_overtime': True}])
+
+
+# A new output directory under the test's temporary directory
+@pytest.fixture
+def output(tmp_path):
+    def make(name):
+        path = tmp_path / name
+        path.mkdir()
+        return str(path)
+    return make
+
+
+# Every sheet of every workbook a run wrote, by file and sheet name
+@pytest.fixture
+def outputs():
+    def read(directory):
+        return {(name, sheet): df
+                for name in sorted(os.listdir(directory)) if name.endswith('.xlsx')
+                for sheet, df in pd.read_excel(os.path.join(directory, name), sheet_name=None).items()}
+    return read
+
+
+# Assert two runs wrote the same workbooks with the same values
+@pytest.fixture
+def same_outputs(outputs):
+    def check(expected, actual):
+        expected, actual = outputs(expected), outputs(actual)
+        assert list(actual) == list(expected)
+        for key in expected:
+            pd.testing.assert_frame_equal(actual[key], expected[key], obj=str(key))
+    return check
@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Payroll_Allocation import allocate_daily_overtime, allocate_weekly_time, week_of
+from Payroll_Pipeline import with_budget
+from Payroll_Rules import compile_rules, make_rules
+
+# Per-client budgets: ACME gets 10 regular hours a day and 45 a week
+CLIENT_RULES = make_rules(overrides=[{'client': 'ACME', 'daily_regular': 10, 'weekly_regular': 45},
+                                     {'agency': 'CSI', 'keep_negative_overtime': True}])
+
+
+# Tickets of a few employees over three payroll weeks: several tickets a day,
+# quarter and odd hours, some rows without an employee or a date
+def tickets(seed, rows=400):
+    rng = np.random.default_rng(seed)
+    names = pd.Series(rng.choice(['Cruz, Alan', 'Silva, Juan', 'Hughes, Chris', 'Garcia, Ana'], rows))
+    names[rng.random(rows) < 0.03] = np.nan
+    dates = pd.Series(pd.Timestamp('2023-06-05') + pd.to_timedelta(rng.integers(0, 21, rows), unit='D'))
+    dates[rng.random(rows) < 0.03] = pd.NaT
+    hours = np.where(rng.random(rows) < 0.5, rng.integers(1, 48, rows) / 4, rng.uniform(0.1, 11, rows))
+    df = pd.DataFrame({
+        'Ticket Date': dates,
+        'Employee Name': names,
+        'Lunch Adjusted': hours,
+        'Agency': rng.choice(['ECO Staffing', 'CSI', None], rows),
+        'JobNo|Customer|Description': rng.choice(['1001|ACME Corp|Retrofit', '1002|Alabama Power|Outage'], rows),
+    })
+    df['Day of the Week'] = df['Ticket Date'].dt.day_name()
+    df['Regular Time'] = df['Lunch Adjusted'].clip(upper=8)
+    return df
+
+
+# Budget of the group a row starts: a number or the row's budget column
+def first_budget(df, index, budget):
+    return df.loc[index, budget] if isinstance(budget, str) else budget
+
+
+# The per-row daily loop Payroll_Combined.py ran before the allocation engine
+def loop_daily_overtime(df, budget=8):
+    overtime = pd.Series(0.0, index=df.index)
+    for name, group_name in df.groupby('Employee Name'):
+        for date, indices in group_name.groupby(group_name['Ticket Date'].dt.date).groups.items():
+            worked_hours_needed = first_budget(df, indices[0], budget)
+            for index in indices:
+                hours = df.loc[index, 'Lunch Adjusted']
+                if worked_hours_needed == 0:
+                    overtime[index] = hours
+                elif worked_hours_needed >= hours:
+                    worked_hours_needed -= hours
+                else:
+                    overtime[index] = hours - worked_hours_needed
+                    worked_hours_needed = 0
+    return overtime
+
+
+# The per-row PAYROLLWEEKLY loop, with the budget spent per payroll week
+def loop_weekly_time(df, budget=40):
+    weekly = pd.DataFrame({'Regular Time': df['Regular Time'].astype(float), 'Overtime': 0.0})
+    weeks = week_of(df['Ticket Date'])
+    for name, group_name in df.groupby(['Employee Name', weeks]):
+        worked_hours_needed = None
+        for date, indices in group_name.groupby(group_name['Ticket Date'].dt.date).groups.items():
+            for index in indices:
+                if worked_hours_needed is None:
+                    worked_hours_needed = first_budget(df, index, budget)
+                hours = df.loc[index, 'Lunch Adjusted']
+                if worked_hours_needed == 0:
+                    weekly.loc[index, 'Overtime'] = hours
+                    weekly.loc[index, 'Regular Time'] = 0
+                elif worked_hours_needed >= hours:
+                    worked_hours_needed -= hours
+                    weekly.loc[index, 'Regular Time'] = hours
+                else:
+                    weekly.loc[index, 'Overtime'] = hours - worked_hours_needed
+                    weekly.loc[index, 'Regular Time'] = worked_hours_needed
+                    worked_hours_needed = 0
+    return weekly
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_daily_overtime_matches_loop(seed):
+    df = tickets(seed)
+    pd.testing.assert_series_equal(allocate_daily_overtime(df), loop_daily_overtime(df), check_names=False)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_weekly_time_matches_loop(seed):
+    df = tickets(seed)
+    pd.testing.assert_frame_equal(allocate_weekly_time(df), loop_weekly_time(df))
+
+
+# A week that spills over 40 hours midweek, on the second ticket of a day
+def test_weekly_spill():
+    df = pd.DataFrame({
+        'Ticket Date': pd.to_datetime(['2023-06-05', '2023-06-06', '2023-06-07', '2023-06-08', '2023-06-09',
+                                       '2023-06-09', '2023-06-12']),
+        'Employee Name': ['Cruz, Alan'] * 7,
+        'Lunch Adjusted': [9.5, 9.5, 9.5, 9.5, 1.5, 3.0, 6.0],
+    })
+    df['Regular Time'] = df['Lunch Adjusted'].clip(upper=8)
+    weekly = allocate_weekly_time(df)
+    assert weekly['Regular Time'].tolist() == [9.5, 9.5, 9.5, 9.5, 1.5, 0.5, 6.0]
+    assert weekly['Overtime'].tolist() == [0.0, 0.0, 0.0, 0.0, 0.0, 2.5, 0.0]
+    pd.testing.assert_frame_equal(weekly, loop_weekly_time(df))
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_client_budgets_match_loop(seed):
+    df = tickets(seed)
+    rules = compile_rules(df, CLIENT_RULES)
+    daily_df, daily_budget = with_budget(df, rules['daily_regular'])
+    weekly_df, weekly_budget = with_budget(df, rules['weekly_regular'])
+    assert isinstance(daily_budget, str) and isinstance(weekly_budget, str)
+
+    pd.testing.assert_series_equal(allocate_daily_overtime(daily_df, budget=daily_budget),
+                                   loop_daily_overtime(daily_df, daily_budget), check_names=False)
+    pd.testing.assert_frame_equal(allocate_weekly_time(weekly_df, budget=weekly_budget),
+                                  loop_weekly_time(weekly_df, weekly_budget))
@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Payroll_Cache
+from Payroll_Cache import cached_frame, evict, load_frame, store_frame
+
+
+# A frame with the column types of the parsed exports
+def sample():
+    return pd.DataFrame({
+        'Employee Name': ['Cruz, Alan', np.nan, 'Silva, Juan'],
+        'Ticket Date': pd.to_datetime(['2023-06-05', '2023-06-06', None]),
+        'Hours Worked': [8.5, np.nan, 3.25],
+        'Actual Hrs': [9, 0, 3],
+    }, index=[2, 5, 7])
+
+
+# A source file and a build that counts its calls
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'clockin.xlsx'
+    path.write_bytes(b'first version')
+    return str(path)
+
+
+def cached(cache_directory, source, calls):
+    def build():
+        calls.append(1)
+        return sample()
+    return cached_frame(str(cache_directory), 'clock-in', [source], (), build)
+
+
+def test_hit(tmp_path, source):
+    calls = []
+    df, hit = cached(tmp_path / 'cache', source, calls)
+    assert not hit
+    df, hit = cached(tmp_path / 'cache', source, calls)
+    assert hit and len(calls) == 1
+    pd.testing.assert_frame_equal(df, sample())
+
+
+def test_changed_file_misses(tmp_path, source):
+    calls = []
+    cached(tmp_path / 'cache', source, calls)
+    with open(source, 'wb') as f:
+        f.write(b'second version')
+    assert not cached(tmp_path / 'cache', source, calls)[1]
+    assert len(calls) == 2
+
+
+def test_schema_version_bump_misses(tmp_path, source, monkeypatch):
+    calls = []
+    cached(tmp_path / 'cache', source, calls)
+    monkeypatch.setattr(Payroll_Cache, 'SCHEMA_VERSION', Payroll_Cache.SCHEMA_VERSION + 1)
+    assert not cached(tmp_path / 'cache', source, calls)[1]
+    assert len(calls) == 2
+
+
+# Without pyarrow the entries are pickled and read back the same
+def test_pickle_entries(tmp_path, source, monkeypatch):
+    monkeypatch.setattr(Payroll_Cache, 'has_arrow', lambda: False)
+    calls = []
+    cached(tmp_path / 'cache', source, calls)
+    assert [name.endswith('.pkl') for name in os.listdir(tmp_path / 'cache')] == [True]
+    df, hit = cached(tmp_path / 'cache', source, calls)
+    assert hit
+    pd.testing.assert_frame_equal(df, sample())
+
+
+# Past the size limit the least recently used entries go first, and loading
+# an entry makes it recently used
+def test_lru_eviction(tmp_path):
+    cache_directory = str(tmp_path / 'cache')
+    for key in ('a', 'b', 'c'):
+        store_frame(cache_directory, key, sample())
+    names = {name[0]: os.path.join(cache_directory, name) for name in os.listdir(cache_directory)}
+    for used, key in enumerate('abc'):
+        os.utime(names[key], (1000 + used, 1000 + used))
+
+    assert load_frame(cache_directory, 'a') is not None
+    evict(cache_directory, 2 * os.path.getsize(names['c']))
+    assert sorted(name[0] for name in os.listdir(cache_directory)) == ['a', 'c']
@@ -0,0 +1,34 @@
+from Payroll_Incremental import run_payroll_incremental
+from Payroll_Pipeline import run_payroll
+
+
+# A first incremental run computes everything and matches a full run
+def test_first_run_matches_full(exports, output, same_outputs):
+    full, incremental = output('full'), output('incremental')
+    run_payroll(*exports, full)
+    run_payroll_incremental(*exports, incremental)
+    same_outputs(full, incremental)
+
+
+# After a punch and a ticket change, the incremental run recomputes their
+# employee-weeks only and still writes the workbooks of a full run
+def test_changed_exports_match_full(exports, frames, output, same_outputs, capsys):
+    full, incremental = output('full'), output('incremental')
+    run_payroll_incremental(*exports, incremental)
+
+    clock_in_df, tickets_df = frames
+    clock_in_df = clock_in_df.copy()
+    clock_in_df.loc[0, 'Clock Out'] += clock_in_df.loc[0, 'Clock Out'] - clock_in_df.loc[0, 'Clock In']
+    clock_in_df.loc[0, 'Hours Worked'] *= 2
+    tickets_df = tickets_df.drop(tickets_df.index[-1])
+    clock_in_df.to_excel(exports[0], index=False)
+    tickets_df.to_excel(exports[1], index=False)
+
+    capsys.readouterr()
+    run_payroll_incremental(*exports, incremental)
+    recomputed = [line for line in capsys.readouterr().out.splitlines() if line.startswith('Recomputing')]
+    changed, total = map(int, recomputed[0].split()[1::2])
+    assert 0 < changed < total
+
+    run_payroll(*exports, full)
+    same_outputs(full, incremental)
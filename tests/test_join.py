@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from Payroll_Join import duplicate_report, join_tickets, TICKET_KEYS
+
+DAY = pd.Timestamp('2023-06-05')
+
+
+# Punches and tickets whose keys repeat, some with a blank name, date or job
+def exports():
+    df1 = pd.DataFrame({
+        'Employee Name': ['Cruz, Alan', 'Cruz, Alan', 'Cruz, Alan', np.nan, np.nan, 'Silva, Juan', 'Silva, Juan'],
+        'Ticket Date': [DAY, DAY, DAY, DAY, DAY, DAY, pd.NaT],
+        'JobNo|Customer|Description': ['4000', np.nan, np.nan, '4000', '4000', '4000', '4000'],
+        'Hours Worked': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0],
+    })
+    df2 = pd.DataFrame({
+        'Employee Name': ['Cruz, Alan', 'Cruz, Alan', np.nan, 'Silva, Juan', 'Silva, Juan', 'Silva, Juan'],
+        'Ticket Date': [DAY, DAY, DAY, pd.NaT, pd.NaT, DAY],
+        'JobNo|Customer|Description': [np.nan, np.nan, '4000', '4000', '4000', '4001'],
+        'Agency': ['ECO', 'CSI', 'ECO', 'CSI', 'ECO', np.nan],
+    })
+    return df1, df2
+
+
+# Blank keys are equal to each other, as in drop_duplicates: every row of a
+# repeated key is reported, the first one kept
+def test_duplicate_report_blank_keys():
+    df1, df2 = exports()
+    report = duplicate_report(df1, df2)
+
+    assert report['Source'].tolist() == ['Clock In'] * 4 + ['Ticket'] * 4
+    assert report['Excel Row'].tolist() == [3, 4, 5, 6, 2, 3, 5, 6]
+    assert report['Kept'].tolist() == ['Yes', 'No'] * 4
+    assert report['Kept Row'].tolist() == [3, 3, 5, 5, 2, 2, 5, 5]
+    for source, df in (('Clock In', df1), ('Ticket', df2)):
+        rows = report[report['Source'] == source]
+        assert (rows['Excel Row'] - 2).tolist() == df.index[df.duplicated(TICKET_KEYS, keep=False)].tolist()
+
+
+# The join gives the rows of a merge on the keys followed by drop_duplicates
+def test_join_matches_merge():
+    df1, df2 = exports()
+    merged_df, _ = join_tickets(df1, df2)
+    expected = pd.merge(df1, df2.drop_duplicates(TICKET_KEYS), on=TICKET_KEYS, how='left')
+    expected = expected.drop_duplicates(TICKET_KEYS)
+    pd.testing.assert_frame_equal(merged_df.reset_index(drop=True), expected.reset_index(drop=True))
+    assert merged_df.index.tolist() == [0, 1, 3, 5, 6]
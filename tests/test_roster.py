@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Payroll_Roster import missing_employees, roster_index
+
+ROSTER = pd.DataFrame({'Employee Name': ['Cruz, Alan', 'Silva, Juan', 'Garcia, Ana'],
+                       'Employee ID': [1000.0, 1001.0, np.nan]})
+
+
+# Tickets of a period: employees on and off the roster, a renamed employee
+# whose ID is on it, several jobs a day and blank names
+def period(categorical=False):
+    df = pd.DataFrame({
+        'Employee Name': ['Cruz, Alan', 'Hughes, Chris', 'Hughes, Chris', 'Hughes, Chris', 'Silva, J.', np.nan,
+                          'Badillo, Brayan', 'Garcia, Ana'],
+        'Employee ID': [1000, 1005, 1005, 1005, 1001, 1009, np.nan, np.nan],
+        'Ticket Date': pd.to_datetime(['2023-06-05', '2023-06-06 07:00', '2023-06-06', '2023-06-05', '2023-06-05',
+                                       '2023-06-05', '2023-06-07', '2023-06-07'], format='ISO8601'),
+        'JobNo|Customer|Description': ['4000', '4000', '4001', '4000', '4000', '4000', '4002', '4000'],
+        'Agency': 'ECO Staffing',
+    })
+    if categorical:
+        df['Employee Name'] = df['Employee Name'].astype('category')
+    return df
+
+
+# The loop OT (1).py ran: every group of the period looked up in the roster
+# names, one report row per group
+def loop_missing(df, roster):
+    names = roster['Employee Name'].unique()
+    rows = []
+    for name, group in df.groupby(['Employee Name', 'JobNo|Customer|Description', 'Agency',
+                                   df['Ticket Date'].dt.date], observed=True):
+        if name[0] not in names:
+            rows.append({'Employee Name': name[0], 'Ticket Date': pd.Timestamp(name[3])})
+    return pd.DataFrame(rows).drop_duplicates().sort_values(['Employee Name', 'Ticket Date']).reset_index(drop=True)
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_matches_loop_by_name(categorical):
+    missing = missing_employees(period(categorical), roster_index(ROSTER))
+    pd.testing.assert_frame_equal(missing, loop_missing(period(), ROSTER))
+    assert missing['Employee Name'].tolist() == ['Badillo, Brayan', 'Hughes, Chris', 'Hughes, Chris', 'Silva, J.']
+
+
+# With match_ids the renamed employee is known by the ID on the roster
+def test_match_ids():
+    missing = missing_employees(period(), roster_index(ROSTER), match_ids=True)
+    assert missing['Employee Name'].tolist() == ['Badillo, Brayan', 'Hughes, Chris', 'Hughes, Chris']
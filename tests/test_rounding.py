@@ -0,0 +1,63 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Payroll_Rounding import round_nanoseconds, round_punches
+
+
+# round_time() of OT (1).py and Small Fixes, applied to one punch at a time
+def round_time(dt):
+    minutes = (dt.minute % 15) * 60 + dt.second
+    if minutes < 7 * 60:
+        dt = dt - datetime.timedelta(minutes=dt.minute % 15, seconds=dt.second)
+    else:
+        dt = dt + datetime.timedelta(minutes=15 - dt.minute % 15, seconds=-dt.second)
+    return dt
+
+
+# Every second of an hour, the same seconds with fractions, and the last
+# seconds of a day
+def punches():
+    seconds = pd.date_range('2023-06-05 06:00', periods=3600, freq='s')
+    fractions = seconds + pd.Timedelta(milliseconds=999)
+    midnight = pd.date_range('2023-06-05 23:45', '2023-06-06 00:00', freq='s')
+    return pd.Series(seconds.append(fractions).append(midnight))
+
+
+def test_matches_round_time():
+    df = punches()
+    pd.testing.assert_series_equal(round_punches(df), df.apply(round_time))
+
+
+# 7 minutes past the mark rounds up, a moment earlier rounds down and keeps
+# the fraction of the second, as round_time does
+def test_threshold():
+    df = pd.Series(pd.to_datetime(['2023-06-05 06:07:00', '2023-06-05 06:06:59.5', '2023-06-05 06:22:00',
+                                   '2023-06-05 23:52:00'], format='ISO8601'))
+    expected = pd.Series(pd.to_datetime(['2023-06-05 06:15:00', '2023-06-05 06:00:00.5', '2023-06-05 06:30:00',
+                                         '2023-06-06 00:00:00'], format='ISO8601'))
+    pd.testing.assert_series_equal(round_punches(df), expected)
+
+
+def test_blank_punches_stay_blank():
+    df = pd.Series(pd.to_datetime(['2023-06-05 06:07:00', None, '2023-06-05 06:05:00']), index=[4, 7, 9])
+    rounded = round_punches(df)
+    assert rounded.index.tolist() == [4, 7, 9]
+    assert rounded.isna().tolist() == [False, True, False]
+    assert rounded[4] == pd.Timestamp('2023-06-05 06:15') and rounded[9] == pd.Timestamp('2023-06-05 06:00')
+
+
+# Tenths of an hour: 6 minute marks, rounded up from 3 minutes past
+def test_other_rules():
+    df = pd.Series(pd.to_datetime(['2023-06-05 06:02:59', '2023-06-05 06:03:00', '2023-06-05 06:59:00']))
+    expected = pd.to_datetime(['2023-06-05 06:00', '2023-06-05 06:06', '2023-06-05 07:00'])
+    assert round_punches(df, 6, 3).tolist() == expected.tolist()
+    assert round_punches(df, 10, 5).tolist() == pd.to_datetime(
+        ['2023-06-05 06:00', '2023-06-05 06:00', '2023-06-05 07:00']).tolist()
+
+
+def test_threshold_past_increment():
+    with pytest.raises(ValueError):
+        round_nanoseconds(np.array([0]), 15, 16)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Payroll_Rules import compile_rules, make_rules, rule_scopes
+
+# Overrides whose agency and client scopes overlap: the first one setting a
+# rule wins for the rows both match
+RULES = make_rules({'double_time_after': 12},
+                   [{'agency': 'ECO', 'daily_regular': 10},
+                    {'client': 'Alabama Power', 'daily_regular': 9, 'weekend_days': ['Sunday'],
+                     'double_time_after': None},
+                    {'agency': 'eco', 'client': 'alabama', 'lunch_after': 6}])
+
+
+# One row per combination of agency and client, on a Saturday
+def tickets(categorical):
+    df = pd.DataFrame({
+        'Agency': ['ECO Staffing', 'ECO Staffing', 'Outsource.net', 'Outsource.net', np.nan],
+        'JobNo|Customer|Description': ['4000 | Alabama Power Company | Plant Barry', '4001 | Hyundai | Body Shop',
+                                       '4000 | Alabama Power Company | Plant Barry', '4001 | Hyundai | Body Shop',
+                                       np.nan],
+        'Day of the Week': 'Saturday',
+    })
+    return df.astype('category') if categorical else df
+
+
+@pytest.mark.parametrize('categorical', [False, True])
+def test_overlapping_scopes(categorical):
+    compiled = compile_rules(tickets(categorical), RULES)
+    # ECO and Alabama Power: the ECO override comes first
+    assert compiled['daily_regular'].tolist() == [10, 10, 9, 8, 8]
+    # Only the Alabama Power override sets the weekend days and double time
+    assert compiled['weekend_days'].tolist() == [False, True, False, True, True]
+    assert np.isnan(compiled['double_time_after'][[0, 2]]).all()
+    assert compiled['double_time_after'][[1, 3, 4]].tolist() == [12, 12, 12]
+    # The override matching both, ignoring case, applies to their rows only
+    assert compiled['lunch_after'].tolist() == [6, 5, 5, 5, 5]
+
+
+def test_rule_scopes():
+    default, scopes = rule_scopes('daily_regular', RULES)
+    assert default == 8
+    assert [(override.get('agency'), override.get('client'), hours) for override, hours in scopes] == [
+        ('ECO', None, 10), (None, 'Alabama Power', 9)]
+
+
+def test_override_must_match():
+    with pytest.raises(ValueError):
+        make_rules(overrides=[{'daily_regular': 10}])
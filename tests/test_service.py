@@ -0,0 +1,96 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from Payroll_Client import submit, status
+from Payroll_Service import job_options, PayrollService
+
+TOKEN = 'test-token'
+
+
+# A service on a free local port, with its token in a file
+@pytest.fixture
+def service(tmp_path):
+    server = PayrollService(('127.0.0.1', 0), 1, TOKEN)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    token_file = tmp_path / 'token'
+    token_file.write_text(TOKEN)
+    yield 'http://127.0.0.1:%d' % server.server_address[1], str(token_file)
+    server.shutdown()
+    server.server_close()
+
+
+# Post a body to /run with some headers; returns the status and the answer
+def post(url, body, headers):
+    call = urllib.request.Request(url + '/run', data=body, headers=headers)
+    try:
+        with urllib.request.urlopen(call) as answer:
+            return answer.status, json.load(answer)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+JOB = {'clock_in': 'a.xlsx', 'tickets': 'b.xlsx', 'output': 'out'}
+AUTHORIZED = {'Content-Type': 'application/json', 'Authorization': 'Bearer %s' % TOKEN}
+
+
+@pytest.mark.parametrize('job', [
+    dict(JOB, shard_workers='2'),
+    dict(JOB, io_workers=True),
+    dict(JOB, partitions=0),
+    dict(JOB, stream='yes'),
+    dict(JOB, cache=3),
+    dict(JOB, clock_in=['a.xlsx']),
+    dict(JOB, week_start=1),
+    dict(JOB, week_start='Someday'),
+    dict(JOB, colour='red'),
+    {'clock_in': 'a.xlsx', 'tickets': 'b.xlsx'},
+    dict(JOB, stream=True, incremental=True),
+    dict(JOB, shard_workers=2, stream=True),
+    ['a.xlsx', 'b.xlsx', 'out'],
+])
+def test_rejected_options(job):
+    with pytest.raises(ValueError):
+        job_options(job)
+
+
+def test_options_defaults():
+    options = job_options(dict(JOB, shard_workers=2, cache=None))
+    assert options['shard_workers'] == 2 and options['io_workers'] == 1 and options['stream'] is False
+
+
+@pytest.mark.parametrize('body, headers, code', [
+    (json.dumps(JOB).encode(), {'Content-Type': 'application/json'}, 401),
+    (json.dumps(JOB).encode(), dict(AUTHORIZED, Authorization='Bearer wrong'), 401),
+    (json.dumps(JOB).encode(), dict(AUTHORIZED, Origin='http://example.com'), 403),
+    (json.dumps(JOB).encode(), dict(AUTHORIZED, **{'Content-Type': 'text/plain'}), 415),
+    (b'{"clock_in": "a.xlsx",', AUTHORIZED, 400),
+    (json.dumps(dict(JOB, shard_workers='2')).encode(), AUTHORIZED, 400),
+    (json.dumps(dict(JOB, colour='red')).encode(), AUTHORIZED, 400),
+])
+def test_rejected_requests(service, body, headers, code):
+    url, token_file = service
+    answer_code, answer = post(url, body, headers)
+    assert answer_code == code
+    assert answer['error']
+    assert status(url, token_file=token_file)['jobs'] == 0
+
+
+# A job sent by the client runs on the service and writes the workbooks of
+# the run, which the answer lists
+def test_round_trip(service, exports, output):
+    url, token_file = service
+    directory = output('out')
+    result = submit({'clock_in': exports[0], 'tickets': exports[1], 'output': directory}, url,
+                    token_file=token_file)
+    assert result['error'] is None
+    assert sorted(os.path.basename(path) for path in result['outputs']) == sorted(
+        name for name in os.listdir(directory))
+    assert 'Payroll.xlsx' in os.listdir(directory)
+    assert [stage['stage'] for stage in result['report']['stages']][0] == 'ingest'
+    assert status(url, token_file=token_file)['jobs'] == 1
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from Payroll_Ingest import ingest
+from Payroll_Pipeline import (allocate_shard, allocate_sharded, combine_shards, employee_order, employee_shards,
+                              merge, run_payroll, SHARD_FRAMES)
+
+
+# The merged tickets of the test exports
+def merged(exports, rules=None):
+    merged_df, _ = merge(*ingest(*exports), rules=rules)
+    return merged_df
+
+
+# Assert the frames of a sharded run equal those of a serial run, dtypes and
+# row order included
+def assert_same_frames(expected, actual):
+    for name, expected_df, actual_df in zip(SHARD_FRAMES, expected, actual):
+        pd.testing.assert_frame_equal(actual_df, expected_df, obj=name)
+
+
+# Allocating every shard on its own and combining them gives the frames of a
+# serial run, whatever the number of shards
+@pytest.mark.parametrize('shards', [2, 3, 5])
+@pytest.mark.parametrize('with_rules', [False, True])
+def test_combined_shards_match_serial(exports, rules, shards, with_rules):
+    rules = rules if with_rules else None
+    merged_df = merged(exports, rules)
+    expected = allocate_shard(merged_df.copy(), rules=rules)
+
+    shard = employee_shards(merged_df['Employee Name'], shards)
+    parts = [allocate_shard(merged_df[shard == number].copy(), rules=rules) for number in range(shards)]
+    assert_same_frames(expected, combine_shards(parts, employee_order(merged_df['Employee Name'])))
+
+
+# The process pool gives the same frames as well
+def test_sharded_pool_matches_serial(exports):
+    merged_df = merged(exports)
+    assert_same_frames(allocate_shard(merged_df.copy()), allocate_sharded(merged_df.copy(), shard_workers=2))
+
+
+# A run with shard workers writes the workbooks of a serial run
+def test_sharded_run_matches_serial(exports, rules, output, same_outputs):
+    serial, sharded = output('serial'), output('sharded')
+    run_payroll(*exports, serial, rules=rules)
+    run_payroll(*exports, sharded, rules=rules, shard_workers=2)
+    same_outputs(serial, sharded)
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+import Payroll_Pipeline
+from Payroll_Pipeline import run_payroll
+from Payroll_Store import list_runs, query, rebuild
+
+
+# Two runs in a store: the exports, then the exports with the first punch
+# of the first employee twice as long
+@pytest.fixture
+def store(tmp_path, exports, frames, output):
+    store_file = str(tmp_path / 'payroll.db')
+    run_payroll(*exports, output('first'), store_file=store_file)
+
+    clock_in_df = frames[0].copy()
+    clock_in_df.loc[0, 'Clock Out'] += clock_in_df.loc[0, 'Clock Out'] - clock_in_df.loc[0, 'Clock In']
+    clock_in_df.loc[0, 'Hours Worked'] *= 2
+    clock_in_df.to_excel(exports[0], index=False)
+    run_payroll(*exports, output('second'), store_file=store_file)
+    return store_file
+
+
+# Every employee-day comes from the latest run holding it
+def test_query_latest_run(store, tmp_path):
+    rows = query(store)
+    assert set(rows['Run']) == {2}
+    assert len(rows) == len(pd.read_excel(tmp_path / 'second' / 'Payroll.xlsx'))
+
+    first = query(store, run_id=1)
+    assert set(first['Run']) == {1}
+    changed = rows[rows['Employee Name'] == 'Cruz, Alan']['Hours Worked'].iloc[0]
+    assert changed == 2 * first[first['Employee Name'] == 'Cruz, Alan']['Hours Worked'].iloc[0]
+
+    day = query(store, employee='Cruz, Alan', start='2023-06-05', end='2023-06-05')
+    assert set(day['Ticket Date'].dt.normalize()) == {pd.Timestamp('2023-06-05')}
+
+
+# A rebuilt run writes the workbooks of the original run
+def test_rebuild(store, output, same_outputs, tmp_path):
+    rebuild(store, 1, output('rebuilt-first'))
+    rebuild(store, 2, output('rebuilt-second'))
+    same_outputs(str(tmp_path / 'first'), str(tmp_path / 'rebuilt-first'))
+    same_outputs(str(tmp_path / 'second'), str(tmp_path / 'rebuilt-second'))
+
+
+# A run that fails leaves nothing in the store
+def test_failed_run_discarded(store, exports, output, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('render failed')
+    monkeypatch.setattr(Payroll_Pipeline, 'render', fail)
+    with pytest.raises(RuntimeError):
+        run_payroll(*exports, output('failed'), store_file=store)
+
+    runs = list_runs(store)
+    assert runs['run_id'].tolist() == [2, 1]
+    assert runs['completed'].notna().all()
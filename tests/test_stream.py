@@ -0,0 +1,21 @@
+import pytest
+
+from Payroll_Pipeline import run_payroll
+from Payroll_Stream import run_payroll_streaming
+
+
+# A streamed run writes the workbooks of a full run, whatever the number of
+# employee partitions
+@pytest.mark.parametrize('partitions', [1, 3, 16])
+def test_stream_matches_full(exports, output, same_outputs, partitions):
+    full, streamed = output('full'), output('streamed')
+    run_payroll(*exports, full)
+    run_payroll_streaming(*exports, streamed, partitions=partitions)
+    same_outputs(full, streamed)
+
+
+def test_stream_matches_full_with_rules(exports, rules, output, same_outputs):
+    full, streamed = output('full'), output('streamed')
+    run_payroll(*exports, full, rules=rules)
+    run_payroll_streaming(*exports, streamed, partitions=3, rules=rules)
+    same_outputs(full, streamed)